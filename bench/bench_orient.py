@@ -0,0 +1,104 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from PIL import Image, ExifTags
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from imgeo.imaging import orient_image, ORIENTATION_TAG
+
+# Compares the orientation handling open_image had before, _getexif() with
+# a scan of ExifTags.TAGS and rotate(expand=True), with the current one,
+# getexif() with the tag resolved at import and a lossless transpose. Each
+# is timed for the tag lookup alone and for the whole open, decode and
+# orient, at full size and at thumbnail size.
+#
+#   python bench/bench_orient.py FOLDER [--rounds 5]
+
+THUMBNAIL_SIZE = (300, 300)
+
+def baseline_orientation(image):
+    exif = image._getexif()
+    if exif is None:
+        return None
+    orientation_key = next(key for key, value in ExifTags.TAGS.items() if value == 'Orientation')
+    return exif.get(orientation_key)
+
+def baseline_orient(image, orientation):
+    # only knew the rotations, 2/4/5/7 were left mirrored
+    if orientation == 3:
+        image = image.rotate(180, expand=True)
+    elif orientation == 6:
+        image = image.rotate(270, expand=True)
+    elif orientation == 8:
+        image = image.rotate(90, expand=True)
+    return image
+
+def current_orientation(image):
+    return image.getexif().get(ORIENTATION_TAG)
+
+def lookup(read_orientation):
+    def run(path, draft_size):
+        with Image.open(path) as image:
+            return read_orientation(image)
+    return run
+
+def open_and_orient(read_orientation, orient):
+    def run(path, draft_size):
+        image = Image.open(path)
+        orientation = read_orientation(image)
+        if draft_size is not None:
+            image.draft(image.mode, draft_size)
+        image.load()
+        return orient(image, orientation)
+    return run
+
+STAGES = {
+    "lookup": (lookup(baseline_orientation), lookup(current_orientation)),
+    "orient": (open_and_orient(baseline_orientation, baseline_orient), open_and_orient(current_orientation, orient_image))
+}
+
+def run(function, paths, rounds, draft_size):
+    for path in paths:
+        function(path, draft_size)
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for path in paths:
+            function(path, draft_size)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EXIF orientation path of open_image.")
+    parser.add_argument("folder", help="folder of JPEG images, ideally with mixed orientations")
+    parser.add_argument("--rounds", type=int, default=5, help="best of this many passes")
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.folder, "*.jpg")) + glob.glob(os.path.join(args.folder, "*.jpeg")))
+    if not paths:
+        print("bench_orient: no JPEG images found", file=sys.stderr)
+        return 1
+    orientations = {}
+    for path in paths:
+        with Image.open(path) as image:
+            orientation = current_orientation(image) or 1
+        orientations[orientation] = orientations.get(orientation, 0) + 1
+    print(f"{len(paths)} images, orientations {dict(sorted(orientations.items()))}, best of {args.rounds}")
+    print(f"{'stage':7} {'size':9} {'baseline ms/img':>16} {'current ms/img':>15} {'speedup':>8}")
+    for stage, (baseline, current) in STAGES.items():
+        for label, draft_size in [("full", None), ("thumbnail", THUMBNAIL_SIZE)]:
+            if stage == "lookup" and draft_size is not None:
+                continue
+            baseline_seconds = run(baseline, paths, args.rounds, draft_size)
+            current_seconds = run(current, paths, args.rounds, draft_size)
+            print(
+                f"{stage:7} {label:9} {baseline_seconds * 1000 / len(paths):16.2f} "
+                f"{current_seconds * 1000 / len(paths):15.2f} {baseline_seconds / current_seconds:7.2f}x"
+            )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
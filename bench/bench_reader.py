@@ -0,0 +1,106 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from datetime import datetime
+import piexif
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from imgeo.exif import build_exif_bytes, insert_exif, read_orientation
+from imgeo.imaging import open_image, orient_image, ORIENTATION_TAG
+from imgeo.reader import map_file
+
+# Compares reading the source images through map_file with the buffered
+# reads the pipeline used before, for a full decode and for the EXIF-only
+# splice, with a cold and a warm page cache.
+#
+#   python bench/bench_reader.py FOLDER [--rounds 5]
+#
+# A cold cache needs root on Linux (sync + drop_caches), elsewhere only the
+# warm numbers are printed.
+
+EXIF_BYTES = build_exif_bytes(datetime(2024, 1, 1, 10), (51, 30, 25), (0, 7, 39), "N", "E")
+
+def buffered_decode(path):
+    image = Image.open(path)
+    orientation = image.getexif().get(ORIENTATION_TAG)
+    image.load()
+    return orient_image(image, orientation)
+
+def mapped_decode(path):
+    return open_image(path)
+
+def buffered_exif_only(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        piexif.load(data)
+    except ValueError:
+        pass
+    buffer = io.BytesIO()
+    piexif.insert(EXIF_BYTES, data, buffer)
+    return buffer.getvalue()
+
+def mapped_exif_only(path):
+    with map_file(path) as data:
+        read_orientation(data)
+        return insert_exif(EXIF_BYTES, data)
+
+STAGES = {
+    "decode": (buffered_decode, mapped_decode),
+    "exif-only": (buffered_exif_only, mapped_exif_only)
+}
+
+def drop_caches():
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3")
+        return True
+    except OSError:
+        return False
+
+def run(function, paths, rounds, cold):
+    best = None
+    for _ in range(rounds):
+        if cold:
+            drop_caches()
+        else:
+            for path in paths:
+                function(path)
+        started = time.perf_counter()
+        for path in paths:
+            function(path)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark mapped against buffered input reading.")
+    parser.add_argument("folder", help="folder of JPEG images")
+    parser.add_argument("--rounds", type=int, default=5, help="best of this many passes")
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.folder, "*.jpg")) + glob.glob(os.path.join(args.folder, "*.jpeg")))
+    if not paths:
+        print("bench_reader: no JPEG images found", file=sys.stderr)
+        return 1
+    megabytes = sum(os.path.getsize(path) for path in paths) / 1e6
+    modes = ["cold", "warm"] if drop_caches() else ["warm"]
+    print(f"{len(paths)} images, {megabytes:.1f} MB, best of {args.rounds}")
+    print(f"{'stage':10} {'cache':5} {'buffered img/s':>15} {'mapped img/s':>13} {'speedup':>8}")
+    for stage, (buffered, mapped) in STAGES.items():
+        for mode in modes:
+            buffered_seconds = run(buffered, paths, args.rounds, mode == "cold")
+            mapped_seconds = run(mapped, paths, args.rounds, mode == "cold")
+            print(
+                f"{stage:10} {mode:5} {len(paths) / buffered_seconds:15.1f} {len(paths) / mapped_seconds:13.1f} "
+                f"{buffered_seconds / mapped_seconds:7.2f}x"
+            )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
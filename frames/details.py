@@ -1,12 +1,18 @@
 import customtkinter as ctk
-from customtkinter import ThemeManager
+from customtkinter import ThemeManager, filedialog
 from PIL import Image, ImageTk
 from tkinter import Canvas, Scrollbar, PhotoImage
 from tkcalendar import Calendar
 from datetime import datetime, date, time
+import os
 import sys
 sys.path.insert(0, "../utils")
-from common import LatitudeRef, LongitudeRef, FloatEntry, IntSpinbox, Corner, open_image
+from common import FloatEntry, IntSpinbox
+from imgeo.models import LatitudeRef, LongitudeRef, Corner
+from imgeo.encode import ENCODER_PROFILES
+from imgeo.thumbcache import ThumbnailCache, ThumbnailService
+from time import monotonic
+import queue
 
 class DetailsFrame(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
@@ -32,6 +38,7 @@ class DetailsFrame(ctk.CTkFrame):
         self.render_longitude_widget()
         self.render_address_widget()
         self.render_pic_name_corner_widget()
+        self.render_output_widget()
         self.render_process_btn()
         self.validate_inputs()
         # self.set_values()
@@ -55,6 +62,48 @@ class DetailsFrame(ctk.CTkFrame):
 
         self.current_row += 1
     
+    def render_output_widget(self):
+        self.save_while_processing = ctk.CTkCheckBox(master=self, text="Save while processing")
+        self.save_while_processing.grid(row=self.current_row, column=0, sticky="W", pady=(20, 0))
+        if self.master.store.save_while_processing:
+            self.save_while_processing.select()
+        
+        self.font_btn = ctk.CTkButton(master=self, text=self.font_btn_text(), command=self.pick_font)
+        self.font_btn.grid(row=self.current_row, column=1, sticky="W", pady=(20, 0), padx=(10, 0))
+        
+        self.stamp_text = ctk.CTkCheckBox(master=self, text="Stamp text (off writes only EXIF)")
+        self.stamp_text.grid(row=self.current_row + 1, column=0, columnspan=2, sticky="W", pady=(10, 0))
+        if self.master.store.stamp_text:
+            self.stamp_text.select()
+        
+        ctk.CTkLabel(master=self, text="Encoder profile", anchor="w").grid(row=self.current_row + 2, column=0, sticky="W", pady=(10, 0))
+        self.encoder_profile = ctk.CTkComboBox(master=self, values=list(ENCODER_PROFILES), state='readonly')
+        self.encoder_profile.set(self.master.store.encoder_profile)
+        self.encoder_profile.grid(row=self.current_row + 2, column=1, sticky="W", pady=(10, 0), padx=(10, 0))
+        
+        ctk.CTkLabel(master=self, text="Max KB per image (0 = no limit)", anchor="w").grid(row=self.current_row + 3, column=0, sticky="W", pady=(10, 0))
+        self.max_kilobytes = IntSpinbox(master=self, from_=0, step_size=100, initial_val=self.master.store.max_kilobytes)
+        self.max_kilobytes.grid(row=self.current_row + 3, column=1, sticky="W", pady=(10, 0), padx=(10, 0))
+        
+        ctk.CTkLabel(master=self, text="Max long edge px (0 = original)", anchor="w").grid(row=self.current_row + 4, column=0, sticky="W", pady=(10, 0))
+        self.max_edge = IntSpinbox(master=self, from_=0, step_size=256, initial_val=self.master.store.max_edge)
+        self.max_edge.grid(row=self.current_row + 4, column=1, sticky="W", pady=(10, 0), padx=(10, 0))
+        self.current_row += 5
+    
+    def font_btn_text(self):
+        if self.master.store.font_path is None:
+            return "Pick Font"
+        return os.path.basename(self.master.store.font_path)
+    
+    def pick_font(self):
+        font_path = filedialog.askopenfilename(
+            title="Select Font",
+            filetypes=[("Font files", "*.ttf;*.otf;*.ttc")]
+        )
+        if font_path:
+            self.master.store.font_path = font_path
+            self.font_btn.configure(text=self.font_btn_text())
+    
     def render_pic_name_corner_widget(self):
         ctk.CTkLabel(
             master=self,
@@ -233,10 +282,20 @@ class DetailsFrame(ctk.CTkFrame):
         self.master.store.corner = Corner.from_string(self.corner.get())
         self.master.store.from_minutes = int(self.from_minutes_box.get())
         self.master.store.to_minutes = int(self.to_minutes_box.get())
+        self.master.store.save_while_processing = bool(self.save_while_processing.get())
+        self.master.store.stamp_text = bool(self.stamp_text.get())
+        self.master.store.encoder_profile = self.encoder_profile.get()
+        self.master.store.max_kilobytes = self.max_kilobytes.get() or 0
+        self.master.store.max_edge = self.max_edge.get() or 0
     
     def process_images(self):
-        self.master.configure(cursor="watch")
         self.save()
+        self.master.store.output_dir = None
+        if self.master.store.save_while_processing:
+            selected_folder = filedialog.askdirectory(title="Select Folder to save images")
+            if not selected_folder:
+                return
+            self.master.store.output_dir = selected_folder
         self.master.next_screen()
     
     def reorder_images(self):
@@ -317,6 +376,10 @@ class DateTimePicker(ctk.CTkToplevel):
             self.date_time = (self.dt.date(), self.dt.time().hour, self.dt.time().minute)
 
 class ImagesGrid(ctk.CTkToplevel):
+    TILE_SIZE = 300
+    CELL_WIDTH = 310
+    CELL_HEIGHT = 345
+    
     def __init__(self, parent):
         super().__init__(parent)
         self.attributes('-topmost', True)
@@ -324,56 +387,57 @@ class ImagesGrid(ctk.CTkToplevel):
         
         self.master = parent
         self.img_indices_order = list(range(len(parent.store.images)))
+        self.thumbnails = ThumbnailService(ThumbnailCache())
+        self.drain_job = None
+        self.viewport_job = None
+        self.resize_job = None
+        # image index -> (PhotoImage, is final preview) for tiles near the viewport
+        self.loaded_previews = {}
+        self.placeholder = ImageTk.PhotoImage(Image.new("RGB", (300, 225), "gray50"))
+        # canvas items recycled for whichever cells are visible, (image, border, number)
+        self.cell_items = []
+        # visible position -> index into cell_items, a cell keeps its items
+        # while it stays in view
+        self.visible_cells = {}
+        self.free_slots = []
+        # what each slot last drew, so unchanged cells aren't touched again
+        self.slot_state = []
+        self.columns = None
         
-        self.image_labels = []
-        self.image_number_labels = []
-        self.selected_image_label = None
-        self.filled_col = None
-        self.selected_image_idx = None
-        
-        self.selected_image_labels = set()
         self.selected_image_indices = set()
         
         appearance_mode = ctk.get_appearance_mode()
-        fg_color = ThemeManager().theme['CTkFrame']['fg_color'][1 if appearance_mode == 'Dark' else 0]
+        theme_idx = 1 if appearance_mode == 'Dark' else 0
+        fg_color = ThemeManager().theme['CTkFrame']['fg_color'][theme_idx]
+        self.text_color = ThemeManager().theme['CTkLabel']['text_color'][theme_idx]
+        self.selection_color = ThemeManager().theme['CTkButton']['fg_color'][theme_idx]
 
+        self.render_actions(master=self)
+        
         self.canvas = ctk.CTkCanvas(master=self, bg=fg_color, borderwidth=0, highlightthickness=0)
         self.scrollbar = ctk.CTkScrollbar(master=self, orientation="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ctk.CTkFrame(master=self.canvas)
-
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
-            )
-        )
-        self.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.configure(yscrollcommand=self.on_canvas_scroll)
         
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        self.canvas.place(relx=0, rely=0, relwidth=1, relheight=1)
         self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
 
-        self.bind("<Configure>", self.on_resize)
-        self.canvas.bind("<Configure>", self.on_canvas_resize)
+        self.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.canvas.bind("<Button-1>", self.on_click_canvas)
 
-        self.render_actions(master=self.scrollable_frame)
         self.load_images(parent.store.images)
+        self.drain_job = self.after(30, self.drain_thumbnails)
     
     def on_mouse_wheel(self, event):
         self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-    
-    def get_label(self, frame):
-        return frame.children['!label']
 
     def select_label(self, sel_idx):
-        self.get_label(self.image_labels[sel_idx]).configure(borderwidth=5, relief=ctk.RIDGE)
         self.selected_image_indices.add(sel_idx)
+        self.draw_cell(sel_idx)
         
     def deselect_label(self, sel_idx):
         self.selected_image_indices.remove(sel_idx)
-        self.get_label(self.image_labels[sel_idx]).configure(borderwidth=5, relief=ctk.FLAT)
+        self.draw_cell(sel_idx)
     
     def deselect_all(self):
         for sel_idx in list(self.selected_image_indices):
@@ -382,7 +446,7 @@ class ImagesGrid(ctk.CTkToplevel):
     
     def render_actions(self, master):
         self.action_frame = ctk.CTkFrame(master=master, fg_color='transparent')
-        self.action_frame.grid(row=0,column=0, pady=10)
+        self.action_frame.pack(side="top", fill="x", padx=10, pady=20)
         
         self.start_index_entry = IntSpinbox(master=self.action_frame)
         self.start_index_entry.pack(side=ctk.LEFT)
@@ -409,96 +473,205 @@ class ImagesGrid(ctk.CTkToplevel):
             return
         
         final_indices_order = []
-        final_image_labels = []
         final_indices = set()
         sorted_indices = sorted(self.selected_image_indices)
-        current_image_len = len(self.image_labels)
+        current_image_len = len(self.img_indices_order)
         
         def addFromIndices(current_idx):
             new_idx = current_idx
             for i in sorted_indices:
                 final_indices_order.append(self.img_indices_order[i])
-                final_image_labels.append(self.image_labels[i])
                 final_indices.add(new_idx)
                 new_idx += 1
         
         for idx in range(0, current_image_len):
             if to_index - 1 == idx:
-                addFromIndices(len(final_image_labels))
+                addFromIndices(len(final_indices_order))
             if idx in sorted_indices:
                 continue
             final_indices_order.append(self.img_indices_order[idx])
-            final_image_labels.append(self.image_labels[idx])
             
         if len(final_indices) == 0:
-            addFromIndices(len(final_image_labels))
+            addFromIndices(len(final_indices_order))
         
         self.img_indices_order = final_indices_order
-        self.image_labels = final_image_labels
         self.selected_image_indices = final_indices
         self.display_images()
     
     def delete_images(self):
-        deleted_images_count = 0
-        for sel_idx in list(self.selected_image_indices):
-            self.img_indices_order.pop(sel_idx - deleted_images_count)
-            self.image_labels.pop(sel_idx - deleted_images_count).grid_forget()
-            self.image_number_labels.pop(sel_idx - deleted_images_count).grid_forget()
-            deleted_images_count += 1
+        for sel_idx in sorted(self.selected_image_indices, reverse=True):
+            self.release_preview(self.img_indices_order.pop(sel_idx))
         
-        self.start_index_entry.configure(to=len(self.image_labels)+1)
+        self.start_index_entry.configure(to=len(self.img_indices_order)+1)
         self.selected_image_indices = set()
         self.display_images()
     
     def reverse_images(self):
         if len(self.selected_image_indices) in [0,1] :
             self.img_indices_order.reverse()
-            self.image_labels.reverse()
             self.display_images()
             return
         sorted_list = sorted(self.selected_image_indices)
         required_order = []
-        check = sorted_list[-2]
-        for idx in range(len(self.image_labels)):
+        for idx in range(len(self.img_indices_order)):
             if idx in sorted_list:
                 required_order.append(sorted_list[-(sorted_list.index(idx)+1)])
             else:
                 required_order.append(idx)
         self.img_indices_order = [self.img_indices_order[idx] for idx in required_order]
-        self.image_labels = [self.image_labels[idx] for idx in required_order]
         self.display_images()
     
     def on_done(self):
         self.master.store.images = [ self.master.store.images[idx] for idx in self.img_indices_order ]
         self.destroy()
     
-    def on_canvas_resize(self, event):
-        canvas_width = event.width
-        self.canvas.itemconfig(1, width=canvas_width)
-    
     def load_images(self, images):
-        for index, img_path in enumerate(images):
-            pil_img = open_image(img_path)
-            pil_img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            tk_img = ImageTk.PhotoImage(pil_img)
-            label = ctk.CTkLabel(master=self.scrollable_frame, image=tk_img, text="")
-            label.image = tk_img
-            label.bind("<Button-1>", lambda event, idx=index: self.on_click_image(event, idx))
-            # label.bind("<B1-Motion>", self.on_drag_image)
-            # label.bind("<ButtonRelease-1>", self.on_drop_image)
-            self.image_labels.append(label)
-            
-            num_label = ctk.CTkLabel(master=self.scrollable_frame, text=str(index + 1))
-            self.image_number_labels.append(num_label)
-        
-        self.start_index_entry.configure(to=index+2)
+        self.start_index_entry.configure(to=len(images)+1)
         self.display_images()
+    
+    def on_canvas_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_viewport_update()
+    
+    def schedule_viewport_update(self):
+        if self.viewport_job is None:
+            self.viewport_job = self.after_idle(self.update_viewport)
+    
+    def visible_rows(self):
+        rows = -(-len(self.img_indices_order) // self.columns)
+        top, bottom = self.canvas.yview()
+        first_row = int(top * rows * self.CELL_HEIGHT) // self.CELL_HEIGHT
+        last_row = min(rows - 1, int(bottom * rows * self.CELL_HEIGHT) // self.CELL_HEIGHT)
+        return first_row, last_row
+    
+    def update_viewport(self):
+        self.viewport_job = None
+        if self.columns is None:
+            return
+        first_row, last_row = self.visible_rows()
+        screen_rows = last_row - first_row + 1
+        
+        # load one screen above and below, drop previews three screens away
+        load_from = max(0, first_row - screen_rows) * self.columns
+        load_to = (last_row + 1 + screen_rows) * self.columns
+        keep_from = max(0, first_row - 3 * screen_rows) * self.columns
+        keep_to = (last_row + 1 + 3 * screen_rows) * self.columns
+        for index in self.img_indices_order[load_from:load_to]:
+            if index not in self.loaded_previews:
+                self.paint_preview(index)
+        kept = set(self.img_indices_order[keep_from:keep_to])
+        for index in list(self.loaded_previews):
+            if index not in kept:
+                self.release_preview(index)
+        
+        positions = range(first_row * self.columns, min(len(self.img_indices_order), (last_row + 1) * self.columns))
+        for position in list(self.visible_cells):
+            if position not in positions:
+                slot = self.visible_cells.pop(position)
+                for item in self.cell_items[slot]:
+                    self.canvas.itemconfigure(item, state="hidden")
+                self.slot_state[slot] = None
+                self.free_slots.append(slot)
+        for position in positions:
+            if position not in self.visible_cells:
+                self.visible_cells[position] = self.take_slot()
+            self.draw_cell(position)
+            
+    def take_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+        self.cell_items.append((
+            self.canvas.create_image(0, 0, state="hidden"),
+            self.canvas.create_rectangle(0, 0, 0, 0, outline=self.selection_color, width=5, state="hidden"),
+            self.canvas.create_text(0, 0, fill=self.text_color, state="hidden")
+        ))
+        self.slot_state.append(None)
+        return len(self.cell_items) - 1
+    
+    def draw_cell(self, position):
+        if position not in self.visible_cells:
+            return
+        slot = self.visible_cells[position]
+        tk_img = self.loaded_previews.get(self.img_indices_order[position], (self.placeholder,))[0]
+        state = (self.columns, tk_img, position in self.selected_image_indices)
+        # only cells whose place, picture or selection changed are redrawn
+        if self.slot_state[slot] == state:
+            return
+        self.slot_state[slot] = state
+        image_item, border_item, number_item = self.cell_items[slot]
+        row, col = divmod(position, self.columns)
+        x = col * self.CELL_WIDTH + self.CELL_WIDTH / 2
+        y = row * self.CELL_HEIGHT + 5 + self.TILE_SIZE / 2
+        half_width, half_height = tk_img.width() / 2, tk_img.height() / 2
+        
+        self.canvas.coords(image_item, x, y)
+        self.canvas.itemconfigure(image_item, image=tk_img, state="normal")
+        self.canvas.coords(border_item, x - half_width - 3, y - half_height - 3, x + half_width + 3, y + half_height + 3)
+        self.canvas.itemconfigure(border_item, state="normal" if position in self.selected_image_indices else "hidden")
+        self.canvas.coords(number_item, x, row * self.CELL_HEIGHT + self.TILE_SIZE + 25)
+        self.canvas.itemconfigure(number_item, text=str(position + 1), state="normal")
+    
+    def paint_preview(self, index):
+        # the tile shows the placeholder until the pool sends its preview
+        self.loaded_previews[index] = (self.placeholder, False)
+        self.thumbnails.request(index, self.master.store.images[index])
+    
+    def set_preview(self, index, tk_img, is_final):
+        self.loaded_previews[index] = (tk_img, is_final)
+        for position in self.visible_cells:
+            if self.img_indices_order[position] == index:
+                self.draw_cell(position)
+    
+    def release_preview(self, index):
+        self.loaded_previews.pop(index, None)
+        self.thumbnails.cancel(index)
+    
+    def drain_thumbnails(self):
+        # PhotoImages can only be made on the Tk thread, take ~30ms worth per
+        # tick so the window keeps handling events in between
+        started = monotonic()
+        while monotonic() - started < 0.03:
+            try:
+                index, size, data, is_final = self.thumbnails.results.get_nowait()
+            except queue.Empty:
+                break
+            # scrolled away, or an EXIF thumbnail arriving after the final preview
+            if index not in self.loaded_previews or self.loaded_previews[index][1]:
+                continue
+            self.set_preview(index, ImageTk.PhotoImage(Image.frombytes("RGB", size, data)), is_final)
+        self.drain_job = self.after(30, self.drain_thumbnails)
+    
+    def destroy(self):
+        if self.drain_job is not None:
+            self.after_cancel(self.drain_job)
+            self.drain_job = None
+        self.thumbnails.shutdown()
+        if self.viewport_job is not None:
+            self.after_cancel(self.viewport_job)
+            self.viewport_job = None
+        if self.resize_job is not None:
+            self.after_cancel(self.resize_job)
+            self.resize_job = None
+        super().destroy()
+
+    def on_click_canvas(self, event):
+        # hit-test the click against the cell grid instead of per-tile bindings
+        if self.columns is None:
+            return
+        x = self.canvas.canvasx(event.x)
+        y = self.canvas.canvasy(event.y)
+        col = int(x // self.CELL_WIDTH)
+        row = int(y // self.CELL_HEIGHT)
+        position = row * self.columns + col
+        if col >= self.columns or position >= len(self.img_indices_order):
+            return
+        if y - row * self.CELL_HEIGHT > self.TILE_SIZE + 10:
+            return
+        self.on_click_image(event, position)
 
     def on_click_image(self, event, idx): 
         ctrl_pressed = event.state & 0x0004 != 0
         shift_pressed = event.state & 0x0001 != 0
-        if event.widget.widgetName != 'label':
-            return
         
         if idx in self.selected_image_indices:
             self.deselect_label(idx)
@@ -527,32 +700,20 @@ class ImagesGrid(ctk.CTkToplevel):
 
 
     def display_images(self):
-        for label in self.image_labels:
-            label.grid_forget()
-        for num_label in self.image_number_labels:
-            num_label.grid_forget()
-        
-        row, col = 1, 0
-        for idx, label in enumerate(self.image_labels):
-            label.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
-            current_label = self.get_label(label)
-            current_label.bind("<Button-1>", lambda event, idx=idx: self.on_click_image(event, idx))
-            current_label.configure(borderwidth=5)
-            self.image_number_labels[idx].grid(row=row + 1, column=col, padx=5, pady=5)
-            self.image_number_labels[idx].configure(text=str(idx + 1))
-            col += 1
-            if (col * 300 + 150) >= self.winfo_width():
-                self.filled_col = col
-                col = 0
-                row += 2  # Increment by 2 to account for image number labels
-        if self.filled_col is None or col > self.filled_col:
-            self.filled_col = col
-        self.action_frame.grid(row=0, column=0, columnspan=self.filled_col, padx=10, pady=20, sticky=ctk.EW)
+        self.columns = max(1, self.canvas.winfo_width() // self.CELL_WIDTH)
+        rows = -(-len(self.img_indices_order) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.CELL_WIDTH, rows * self.CELL_HEIGHT))
+        self.update_viewport()
 
     def on_resize(self, event):
-        
-        if ( self.filled_col is None or 
-            ((self.filled_col) * 300 < self.winfo_width()) or
-            ((self.filled_col - 1) * 300 > self.winfo_width())
-            ):
+        # a drag-resize sends a burst of events, relayout once it settles
+        if self.resize_job is not None:
+            self.after_cancel(self.resize_job)
+        self.resize_job = self.after(150, self.on_resize_done)
+
+    def on_resize_done(self):
+        self.resize_job = None
+        if self.columns != max(1, self.canvas.winfo_width() // self.CELL_WIDTH):
             self.display_images()
+        else:
+            self.schedule_viewport_update()
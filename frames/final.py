@@ -1,147 +1,165 @@
 import customtkinter as ctk
 from customtkinter import filedialog
-from PIL import Image, ImageDraw, ImageFont, ImageTk
-import piexif
+from PIL import Image, ImageTk
 import os
 import sys
 sys.path.insert(0, "../utils")
-from common import FinalImage,Corner, open_image
-from datetime import timedelta
-import secrets
+from imgeo.plan import plan_jobs
+from imgeo.processing import process_batch, is_exif_only, job_output_name
+from imgeo.writer import write_images, name_clashes
+import threading
+import queue
+import time
 
 class FinalFrame(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
         self.master = master
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        self.poll_id = None
+        self.error = None
+        self.save_results = queue.Queue()
+        self.save_poll_id = None
         self.render_widgets()
         self.process_images()
 
-    def secure_random_number(self, start, end):
-        return secrets.randbelow(end - start) + start
-    
     def process_images(self):
-        last_datetime = self.master.store.datetime.replace(second=self.secure_random_number(0, 60))
-        for image_path in self.master.store.images:
-            image = open_image(image_path)
-            date = last_datetime
-            last_datetime = self.get_rand_datetime(last_datetime)
-            latitude = self.randomize_last_three_decimals(abs(self.master.store.latitude_deg))
-            longitude = self.randomize_last_three_decimals(abs(self.master.store.longitude_deg))
-            
-            self.imprint_info_on_image(
-                image=image,
-                date=date.strftime("%d %b %Y  %H:%M:%S"),
-                latitude=f"{latitude}{self.master.store.latitude_ref}",
-                longitude=f"{longitude}{self.master.store.longitude_ref}",
-                address=self.master.store.address,
-                pic_name=self.master.store.pic_name,
-                filepath=image_path,
-                corner=self.master.store.corner,
-                font_s=self.master.store.font_size
+        store = self.master.store
+        max_bytes = store.max_kilobytes * 1024 if store.max_kilobytes else None
+        max_edge = store.max_edge or None
+        clashes = name_clashes(
+            store.images,
+            lambda path: job_output_name(path, store.encoder_profile, store.stamp_text, max_bytes, max_edge)
+        )
+        if clashes:
+            self.cancel_btn.configure(state=ctk.DISABLED)
+            self.status_label.configure(
+                text="These images would be saved under the same name:\n" + "\n".join(", ".join(paths) for paths in clashes.values())
             )
-            exif_bytes = self.build_exif_bytes(dt=date, latitude=latitude, longitude=longitude)
-            self.master.store.insert_final_image(image_path=image_path, image=image, exif_bytes=exif_bytes)
-        self.master.configure(cursor="")
-        self.download_btn.configure(state=ctk.NORMAL)
+            return
+        jobs = plan_jobs(
+            image_paths=store.images,
+            start=store.datetime,
+            latitude_deg=store.latitude_deg,
+            longitude_deg=store.longitude_deg,
+            latitude_ref=store.latitude_ref,
+            longitude_ref=store.longitude_ref,
+            address=store.address,
+            pic_name=store.pic_name,
+            corner=store.corner,
+            font_s=store.font_size,
+            from_minutes=store.from_minutes,
+            to_minutes=store.to_minutes,
+            font_path=store.font_path,
+            output_dir=store.output_dir,
+            stamp_text=store.stamp_text,
+            profile=store.encoder_profile,
+            max_bytes=max_bytes,
+            max_edge=max_edge
+        )
+        self.total_images = len(jobs)
+        self.processed_images = 0
+        self.encoded_bytes = 0
+        self.encode_seconds = 0.0
+        self.spliced_images = 0
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.started_at = time.monotonic()
+        self.worker = threading.Thread(target=self.run_batch, args=(jobs, store.workers), daemon=True)
+        self.worker.start()
+        self.poll_id = self.after(100, self.poll_results)
     
-    def randomize_last_three_decimals(self, value):
-        value_str = f"{value:.8f}"
-        whole_part, decimal_part = value_str.split('.')
-        first_five_decimals = decimal_part[:5]
-        last_three_random = f"{self.secure_random_number(0, 999):03d}"
-        new_value_str = f"{whole_part}.{first_five_decimals}{last_three_random}"
-        return float(new_value_str)
+    def run_batch(self, jobs, workers):
+        # runs on the worker thread, the UI is only touched from poll_results
+        batch = process_batch(jobs, max_workers=workers)
+        try:
+            for final_image in batch:
+                if self.cancel_event.is_set():
+                    break
+                self.results.put(("image", final_image))
+        except Exception as e:
+            self.results.put(("error", e))
+        finally:
+            batch.close()
+            self.results.put(("done", None))
     
-    def get_rand_datetime(self, last):
-        random_minutes = self.secure_random_number(self.master.store.from_minutes, self.master.store.to_minutes)
-        random_seconds = self.secure_random_number(0, 60)
-        return last.replace(second=random_seconds) + timedelta(minutes=random_minutes)
+    def poll_results(self):
+        self.poll_id = None
+        while True:
+            try:
+                kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "image":
+                self.master.store.insert_final_image(value)
+                self.processed_images += 1
+                self.encoded_bytes += value.encoded_bytes
+                # spliced JPEGs never went through the profile's encoder
+                if is_exif_only(value.image_path, self.master.store.stamp_text, self.max_bytes, self.max_edge):
+                    self.spliced_images += 1
+                else:
+                    self.encode_seconds += value.encode_seconds
+            elif kind == "error":
+                self.error = value
+            else:
+                self.on_batch_done()
+                return
+        if not self.cancel_event.is_set():
+            self.update_progress()
+        self.poll_id = self.after(100, self.poll_results)
     
-    def imprint_info_on_image(self, image, date, latitude, longitude, address, filepath, pic_name, corner, font_s):
-        text = f"{date}\n{latitude} {longitude}\n{address}"
-        if pic_name is not None and pic_name != "":
-            text += f"\n{pic_name}"
-        width, height = image.size
-        
-        ratio = 8 / 7
-        if (width / height) > 1.25:
-            ratio = 5 / 7
-        if (height / width) > 1.4:
-            ratio = 10 / 7
-
-
-        long_line = max(text.split("\n"), key=len)
-        font_size = int((width / len(long_line)) * ratio)
-        font = ImageFont.truetype("arial.ttf", font_size)
-        
-        draw = ImageDraw.Draw(image)
-        text_width = draw.textlength(long_line, font=font)
-        
-        while text_width > width - 20:  
-            font_size -= 1
-            font = ImageFont.truetype("arial.ttf", font_size)
-            text_width = draw.textlength(long_line, font=font)
-        
-        if(font_s != 0):
-            font = ImageFont.truetype("arial.ttf", font_s)
-
-        text_block_height = font.size * len(text.split("\n"))
-        if corner == Corner.TOP_LEFT:
-            position = (10, 10)
-        elif corner == Corner.TOP_RIGHT:
-            position = (width - text_width - 10, 10)
-        elif corner == Corner.BOTTOM_LEFT:
-            position = (10, height - text_block_height - 10)
+    def update_progress(self):
+        elapsed = time.monotonic() - self.started_at
+        rate = self.processed_images / elapsed if elapsed > 0 else 0
+        if rate > 0:
+            eta = int((self.total_images - self.processed_images) / rate)
+            eta_text = f"{eta // 60:02}:{eta % 60:02}"
         else:
-            position = (width - text_width - 10, height - text_block_height - 10)
-        # position = (10, height - text_block_height - 10)
-        
-        # rectangle_position = (position[0] - 10, position[1] - 10, position[0] + text_width + 10, position[1] + text_block_height + 10)
-        # rectangle = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        # rectangle_draw = ImageDraw.Draw(rectangle)
-        # rectangle_draw.rectangle(rectangle_position, fill=(0, 0, 0, 64)) 
-        # image.paste(rectangle, mask=rectangle)
-        
-        lines = text.split("\n")
-        y_text = position[1]
-        for line in lines:
-            line_width = draw.textlength(line, font=font)
-            line_height = font.size
-            if corner in [Corner.TOP_RIGHT, Corner.BOTTOM_RIGHT]:
-                x_text = width - line_width - 10
-            else:
-                x_text = position[0]
-            draw.text((x_text, y_text), line, font=font, fill="white")
-            y_text += line_height
-        
-        # draw.text(position, text, font=font, fill="white")
+            eta_text = "--:--"
+        self.progress_bar.set(self.processed_images / max(self.total_images, 1))
+        self.status_label.configure(
+            text=f"{self.processed_images}/{self.total_images} images  ·  {rate:.1f} img/s  ·  ETA {eta_text}"
+        )
     
-    def build_exif_bytes(self, dt, latitude, longitude):
-        exif_dict = {
-            "0th": {},
-            "Exif": {},
-            "GPS": {}
-        }
-        def to_deg(value):
-            deg = int(value)
-            min = int((value - deg) * 60)
-            sec = int((value - deg - min/60) * 3600)
-            return (deg, min, sec)
-        lat = to_deg(latitude)
-        lon = to_deg(longitude)
-        
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = self.master.store.latitude_ref.encode('utf-8')
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = [(lat[0], 1), (lat[1], 1), (lat[2], 1)]
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitudeRef] = self.master.store.longitude_ref.encode('utf-8')
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = [(lon[0], 1), (lon[1], 1), (lon[2], 1)]
-
-        date_str = dt.strftime('%Y:%m:%d %H:%M:%S')
-        exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_str.encode('utf-8')
-        exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_str.encode('utf-8')
-        exif_dict["0th"][piexif.ImageIFD.DateTime] = date_str.encode('utf-8')
-        
-        exif_bytes = piexif.dump(exif_dict)
-        return exif_bytes
+    def on_batch_done(self):
+        self.cancel_btn.configure(state=ctk.DISABLED)
+        if self.error is not None:
+            self.status_label.configure(text=f"Processing failed: {self.error}")
+            return
+        if self.processed_images < self.total_images:
+            self.status_label.configure(text=f"Cancelled after {self.processed_images}/{self.total_images} images")
+            return
+        self.update_progress()
+        encoded_images = self.processed_images - self.spliced_images
+        details = []
+        if encoded_images:
+            details.append(
+                f"{self.master.store.encoder_profile}: {self.encode_seconds * 1000 / encoded_images:.0f} ms encode per image"
+            )
+        if self.spliced_images:
+            details.append(f"{self.spliced_images} JPEGs with only their EXIF replaced")
+        encode_summary = f"{self.encoded_bytes / 1024 / 1024:.1f} MB, " + ", ".join(details)
+        if self.master.store.output_dir is not None:
+            self.status_label.configure(text=f"Saved {self.processed_images} images to {self.master.store.output_dir}\n{encode_summary}")
+            return
+        self.status_label.configure(text=f"{self.processed_images} images ready  ·  {encode_summary}")
+        self.download_btn.configure(state=ctk.NORMAL)
+    
+    def cancel(self):
+        self.cancel_event.set()
+        self.cancel_btn.configure(state=ctk.DISABLED)
+        self.status_label.configure(text="Cancelling...")
+    
+    def destroy(self):
+        self.cancel_event.set()
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
+        if self.save_poll_id is not None:
+            self.after_cancel(self.save_poll_id)
+            self.save_poll_id = None
+        super().destroy()
     
     def display_image(self, image):
         (width, height) = image.size
@@ -152,18 +170,84 @@ class FinalFrame(ctk.CTkFrame):
     
     def save_images(self):
         selected_folder = filedialog.askdirectory(title="Select Folder to save images")
-        if selected_folder:
-            for fi in self.master.store.get_final_images():
-                save_path = f"{selected_folder}/{os.path.basename(fi.image_path)}"
-                fi.image.save(save_path, quality=100, exif_bytes=fi.exif_bytes)
-            
-            
+        if not selected_folder:
+            return
+        final_images = self.master.store.get_final_images()
+        self.download_btn.configure(state=ctk.DISABLED)
+        self.saved_images = 0
+        self.save_total = len(final_images)
+        self.save_error = None
+        self.save_folder = selected_folder
+        self.progress_bar.set(0)
+        self.saver = threading.Thread(
+            target=self.run_save,
+            args=(final_images, selected_folder, self.master.store.workers),
+            daemon=True
+        )
+        self.saver.start()
+        self.save_poll_id = self.after(100, self.poll_saves)
+    
+    def run_save(self, final_images, folder, workers):
+        # runs on the saver thread, files are written by the pool in write_images
+        writes = write_images(final_images, folder, max_workers=workers)
+        try:
+            for output_path in writes:
+                if self.cancel_event.is_set():
+                    break
+                self.save_results.put(("saved", output_path))
+        except Exception as e:
+            self.save_results.put(("error", e))
+        finally:
+            writes.close()
+            self.save_results.put(("done", None))
+    
+    def poll_saves(self):
+        self.save_poll_id = None
+        while True:
+            try:
+                kind, value = self.save_results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "saved":
+                self.saved_images += 1
+                self.progress_bar.set(self.saved_images / max(self.save_total, 1))
+                self.status_label.configure(
+                    text=f"Saved {self.saved_images}/{self.save_total}  ·  {os.path.basename(value)}"
+                )
+            elif kind == "error":
+                self.save_error = value
+            else:
+                self.on_save_done()
+                return
+        self.save_poll_id = self.after(100, self.poll_saves)
+    
+    def on_save_done(self):
+        self.download_btn.configure(state=ctk.NORMAL)
+        if self.save_error is not None:
+            self.status_label.configure(text=f"Saving failed after {self.saved_images} images: {self.save_error}")
+            return
+        self.status_label.configure(text=f"Saved {self.saved_images} images to {self.save_folder}")
     
     def render_widgets(self):
+        self.status_label = ctk.CTkLabel(master=self, text="Starting...")
+        self.status_label.place(relx=0.5, rely=0.34, anchor=ctk.CENTER)
+        
+        self.progress_bar = ctk.CTkProgressBar(master=self)
+        self.progress_bar.set(0)
+        self.progress_bar.place(relx=0.5, rely=0.4, anchor=ctk.CENTER)
+        
         self.download_btn = ctk.CTkButton(
             master=self,
             text="Download Images",
             command=self.save_images,
             state=ctk.DISABLED
         )
-        self.download_btn.place(relx=0.5, rely=0.5, anchor= ctk.CENTER)
+        if self.master.store.output_dir is None:
+            self.download_btn.place(relx=0.5, rely=0.5, anchor= ctk.CENTER)
+        
+        self.cancel_btn = ctk.CTkButton(
+            master=self,
+            text="Cancel",
+            command=self.cancel
+        )
+        self.cancel_btn.place(relx=0.5, rely=0.58, anchor=ctk.CENTER)
@@ -1,52 +1,37 @@
+import sys
+if __name__ == "__main__" and "--batch" in sys.argv[1:]:
+    # headless run, dispatched before any Tk module gets imported
+    import multiprocessing
+    from imgeo.cli import main
+    multiprocessing.freeze_support()
+    sys.argv.remove("--batch")
+    sys.exit(main(sys.argv[1:]))
+
 import customtkinter as ctk
 from customtkinter import filedialog, ThemeManager
 from tkinterdnd2 import TkinterDnD, DND_FILES
 from tkcalendar import Calendar
-from PIL import Image, ImageDraw, ImageFont, ImageTk, ExifTags
-import piexif
-from datetime import datetime, date, time, timedelta
+from PIL import Image, ImageTk
+from datetime import datetime, date
 from typing import List
 from enum import Enum
 import os
-import sys
-import secrets
+import threading
+import queue
+import time
+import multiprocessing
+from imgeo.models import LatitudeRef, LongitudeRef, Corner, FinalImage
+from imgeo.encode import ENCODER_PROFILES, DEFAULT_PROFILE
+from imgeo.thumbcache import ThumbnailCache, ThumbnailService
+from imgeo.plan import plan_jobs
+from imgeo.processing import process_batch, is_exif_only, job_output_name
+from imgeo.writer import write_images, name_clashes
 
 class Screen(Enum):
     HOME="home"
     DETAILS="details"
     FINAL="FINAL"
 
-class LatitudeRef(Enum):
-    N="N"
-    S="S"
-    
-    @classmethod
-    def values(self):
-        return [el.value for el in self]
-
-class LongitudeRef(Enum):
-    E="E"
-    W="W"
-    @classmethod
-    def values(self):
-        return [el.value for el in self]
-
-class Corner(Enum):
-    TOP_LEFT="Top Left"
-    TOP_RIGHT="Top Right"
-    BOTTOM_LEFT="Bottom Left"
-    BOTTOM_RIGHT="Bottom Right"
-    
-    @classmethod
-    def values(self):
-        return [el.value for el in self]
-    
-    @classmethod
-    def from_string(self, val):
-        for mem in self:
-            if mem.value == val:
-                return mem
-        return val
 class FloatEntry(ctk.CTkEntry):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -61,16 +46,6 @@ class FloatEntry(ctk.CTkEntry):
             return False
         return 0 <= value <= 90
 
-class FinalImage:
-    image_path: str
-    image: Image.Image
-    exif_bytes: bytes
-    
-    def __init__(self, image_path: str, image: Image.Image, exif_bytes: bytes):
-        self.image_path = image_path
-        self.image = image
-        self.exif_bytes = image
-
 class IntSpinbox(ctk.CTkFrame):
     def __init__(self, *args,
                  width: int = 100,
@@ -177,27 +152,6 @@ class IntSpinbox(ctk.CTkFrame):
                 self.add_button.configure(state=ctk.NORMAL)
         super().configure(**kwargs)
 
-def open_image(image_path):
-    
-    image = Image.open(image_path)
-    
-    try:
-        exif = image._getexif()
-        if exif is not None:
-            orientation_key = next(key for key, value in ExifTags.TAGS.items() if value == 'Orientation')
-
-            if orientation_key in exif:
-                if exif[orientation_key] == 3:
-                    image = image.rotate(180, expand=True)
-                elif exif[orientation_key] == 6:
-                    image = image.rotate(270, expand=True)
-                elif exif[orientation_key] == 8:
-                    image = image.rotate(90, expand=True)
-    except (AttributeError, KeyError, IndexError):
-        pass
-
-    return image
-
 class Store:
     _instance = None
     current_screen: Screen = Screen.HOME
@@ -214,6 +168,14 @@ class Store:
     to_minutes: int = 0
     corner: Corner = Corner.BOTTOM_RIGHT
     font_size: int = 0
+    font_path: str = None
+    workers: int = 0
+    save_while_processing: bool = False
+    stamp_text: bool = True
+    encoder_profile: str = DEFAULT_PROFILE
+    max_kilobytes: int = 0
+    max_edge: int = 0
+    output_dir: str = None
     
     def __new__(self, *args, **kwargs):
         if not self._instance:
@@ -235,8 +197,8 @@ class Store:
             "address": self.address
         }
         
-    def insert_final_image(self, image_path: str, image: Image.Image, exif_bytes: bytes):
-        self._final_images.append(FinalImage(image_path=image_path, image=image, exif_bytes=exif_bytes))
+    def insert_final_image(self, final_image: FinalImage):
+        self._final_images.append(final_image)
         
     def get_final_images(self):
         return self._final_images
@@ -258,6 +220,13 @@ class Store:
         self.to_minutes = 0
         self.corner = Corner.BOTTOM_RIGHT
         self.font_size = 0
+        self.font_path = None
+        self.save_while_processing = False
+        self.stamp_text = True
+        self.max_edge = 0
+        self.max_kilobytes = 0
+        self.encoder_profile = DEFAULT_PROFILE
+        self.output_dir = None
 
 class HomeFrame(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
@@ -368,6 +337,7 @@ class DetailsFrame(ctk.CTkFrame):
         self.render_longitude_widget()
         self.render_address_widget()
         self.render_pic_name_corner_widget()
+        self.render_output_widget()
         self.render_process_btn()
         self.validate_inputs()
         # self.set_values()
@@ -391,6 +361,48 @@ class DetailsFrame(ctk.CTkFrame):
 
         self.current_row += 1
     
+    def render_output_widget(self):
+        self.save_while_processing = ctk.CTkCheckBox(master=self, text="Save while processing")
+        self.save_while_processing.grid(row=self.current_row, column=0, sticky="W", pady=(20, 0))
+        if self.master.store.save_while_processing:
+            self.save_while_processing.select()
+        
+        self.font_btn = ctk.CTkButton(master=self, text=self.font_btn_text(), command=self.pick_font)
+        self.font_btn.grid(row=self.current_row, column=1, sticky="W", pady=(20, 0), padx=(10, 0))
+        
+        self.stamp_text = ctk.CTkCheckBox(master=self, text="Stamp text (off writes only EXIF)")
+        self.stamp_text.grid(row=self.current_row + 1, column=0, columnspan=2, sticky="W", pady=(10, 0))
+        if self.master.store.stamp_text:
+            self.stamp_text.select()
+        
+        ctk.CTkLabel(master=self, text="Encoder profile", anchor="w").grid(row=self.current_row + 2, column=0, sticky="W", pady=(10, 0))
+        self.encoder_profile = ctk.CTkComboBox(master=self, values=list(ENCODER_PROFILES), state='readonly')
+        self.encoder_profile.set(self.master.store.encoder_profile)
+        self.encoder_profile.grid(row=self.current_row + 2, column=1, sticky="W", pady=(10, 0), padx=(10, 0))
+        
+        ctk.CTkLabel(master=self, text="Max KB per image (0 = no limit)", anchor="w").grid(row=self.current_row + 3, column=0, sticky="W", pady=(10, 0))
+        self.max_kilobytes = IntSpinbox(master=self, from_=0, step_size=100, initial_val=self.master.store.max_kilobytes)
+        self.max_kilobytes.grid(row=self.current_row + 3, column=1, sticky="W", pady=(10, 0), padx=(10, 0))
+        
+        ctk.CTkLabel(master=self, text="Max long edge px (0 = original)", anchor="w").grid(row=self.current_row + 4, column=0, sticky="W", pady=(10, 0))
+        self.max_edge = IntSpinbox(master=self, from_=0, step_size=256, initial_val=self.master.store.max_edge)
+        self.max_edge.grid(row=self.current_row + 4, column=1, sticky="W", pady=(10, 0), padx=(10, 0))
+        self.current_row += 5
+    
+    def font_btn_text(self):
+        if self.master.store.font_path is None:
+            return "Pick Font"
+        return os.path.basename(self.master.store.font_path)
+    
+    def pick_font(self):
+        font_path = filedialog.askopenfilename(
+            title="Select Font",
+            filetypes=[("Font files", "*.ttf;*.otf;*.ttc")]
+        )
+        if font_path:
+            self.master.store.font_path = font_path
+            self.font_btn.configure(text=self.font_btn_text())
+    
     def render_pic_name_corner_widget(self):
         ctk.CTkLabel(
             master=self,
@@ -569,10 +581,20 @@ class DetailsFrame(ctk.CTkFrame):
         self.master.store.corner = Corner.from_string(self.corner.get())
         self.master.store.from_minutes = int(self.from_minutes_box.get())
         self.master.store.to_minutes = int(self.to_minutes_box.get())
+        self.master.store.save_while_processing = bool(self.save_while_processing.get())
+        self.master.store.stamp_text = bool(self.stamp_text.get())
+        self.master.store.encoder_profile = self.encoder_profile.get()
+        self.master.store.max_kilobytes = self.max_kilobytes.get() or 0
+        self.master.store.max_edge = self.max_edge.get() or 0
     
     def process_images(self):
-        self.master.configure(cursor="watch")
         self.save()
+        self.master.store.output_dir = None
+        if self.master.store.save_while_processing:
+            selected_folder = filedialog.askdirectory(title="Select Folder to save images")
+            if not selected_folder:
+                return
+            self.master.store.output_dir = selected_folder
         self.master.next_screen()
     
     def reorder_images(self):
@@ -585,7 +607,6 @@ class DetailsFrame(ctk.CTkFrame):
         self.pic_name.insert(0, "Bathroom 1")
         self.validate_inputs()
 
-
 class DateTimePicker(ctk.CTkToplevel):
     def __init__(self, parent, dt=datetime.now()):
         super().__init__(parent)
@@ -653,6 +674,10 @@ class DateTimePicker(ctk.CTkToplevel):
             self.date_time = (self.dt.date(), self.dt.time().hour, self.dt.time().minute)
 
 class ImagesGrid(ctk.CTkToplevel):
+    TILE_SIZE = 300
+    CELL_WIDTH = 310
+    CELL_HEIGHT = 345
+    
     def __init__(self, parent):
         super().__init__(parent)
         self.attributes('-topmost', True)
@@ -660,56 +685,57 @@ class ImagesGrid(ctk.CTkToplevel):
         
         self.master = parent
         self.img_indices_order = list(range(len(parent.store.images)))
+        self.thumbnails = ThumbnailService(ThumbnailCache())
+        self.drain_job = None
+        self.viewport_job = None
+        self.resize_job = None
+        # image index -> (PhotoImage, is final preview) for tiles near the viewport
+        self.loaded_previews = {}
+        self.placeholder = ImageTk.PhotoImage(Image.new("RGB", (300, 225), "gray50"))
+        # canvas items recycled for whichever cells are visible, (image, border, number)
+        self.cell_items = []
+        # visible position -> index into cell_items, a cell keeps its items
+        # while it stays in view
+        self.visible_cells = {}
+        self.free_slots = []
+        # what each slot last drew, so unchanged cells aren't touched again
+        self.slot_state = []
+        self.columns = None
         
-        self.image_labels = []
-        self.image_number_labels = []
-        self.selected_image_label = None
-        self.filled_col = None
-        self.selected_image_idx = None
-        
-        self.selected_image_labels = set()
         self.selected_image_indices = set()
         
         appearance_mode = ctk.get_appearance_mode()
-        fg_color = ThemeManager().theme['CTkFrame']['fg_color'][1 if appearance_mode == 'Dark' else 0]
+        theme_idx = 1 if appearance_mode == 'Dark' else 0
+        fg_color = ThemeManager().theme['CTkFrame']['fg_color'][theme_idx]
+        self.text_color = ThemeManager().theme['CTkLabel']['text_color'][theme_idx]
+        self.selection_color = ThemeManager().theme['CTkButton']['fg_color'][theme_idx]
 
+        self.render_actions(master=self)
+        
         self.canvas = ctk.CTkCanvas(master=self, bg=fg_color, borderwidth=0, highlightthickness=0)
         self.scrollbar = ctk.CTkScrollbar(master=self, orientation="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ctk.CTkFrame(master=self.canvas)
-
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
-            )
-        )
-        self.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.configure(yscrollcommand=self.on_canvas_scroll)
         
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        self.canvas.place(relx=0, rely=0, relwidth=1, relheight=1)
         self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
 
-        self.bind("<Configure>", self.on_resize)
-        self.canvas.bind("<Configure>", self.on_canvas_resize)
+        self.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.canvas.bind("<Button-1>", self.on_click_canvas)
 
-        self.render_actions(master=self.scrollable_frame)
         self.load_images(parent.store.images)
+        self.drain_job = self.after(30, self.drain_thumbnails)
     
     def on_mouse_wheel(self, event):
         self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-    
-    def get_label(self, frame):
-        return frame.children['!label']
 
     def select_label(self, sel_idx):
-        self.get_label(self.image_labels[sel_idx]).configure(borderwidth=5, relief=ctk.RIDGE)
         self.selected_image_indices.add(sel_idx)
+        self.draw_cell(sel_idx)
         
     def deselect_label(self, sel_idx):
         self.selected_image_indices.remove(sel_idx)
-        self.get_label(self.image_labels[sel_idx]).configure(borderwidth=5, relief=ctk.FLAT)
+        self.draw_cell(sel_idx)
     
     def deselect_all(self):
         for sel_idx in list(self.selected_image_indices):
@@ -718,7 +744,7 @@ class ImagesGrid(ctk.CTkToplevel):
     
     def render_actions(self, master):
         self.action_frame = ctk.CTkFrame(master=master, fg_color='transparent')
-        self.action_frame.grid(row=0,column=0, pady=10)
+        self.action_frame.pack(side="top", fill="x", padx=10, pady=20)
         
         self.start_index_entry = IntSpinbox(master=self.action_frame)
         self.start_index_entry.pack(side=ctk.LEFT)
@@ -745,96 +771,205 @@ class ImagesGrid(ctk.CTkToplevel):
             return
         
         final_indices_order = []
-        final_image_labels = []
         final_indices = set()
         sorted_indices = sorted(self.selected_image_indices)
-        current_image_len = len(self.image_labels)
+        current_image_len = len(self.img_indices_order)
         
         def addFromIndices(current_idx):
             new_idx = current_idx
             for i in sorted_indices:
                 final_indices_order.append(self.img_indices_order[i])
-                final_image_labels.append(self.image_labels[i])
                 final_indices.add(new_idx)
                 new_idx += 1
         
         for idx in range(0, current_image_len):
             if to_index - 1 == idx:
-                addFromIndices(len(final_image_labels))
+                addFromIndices(len(final_indices_order))
             if idx in sorted_indices:
                 continue
             final_indices_order.append(self.img_indices_order[idx])
-            final_image_labels.append(self.image_labels[idx])
             
         if len(final_indices) == 0:
-            addFromIndices(len(final_image_labels))
+            addFromIndices(len(final_indices_order))
         
         self.img_indices_order = final_indices_order
-        self.image_labels = final_image_labels
         self.selected_image_indices = final_indices
         self.display_images()
     
     def delete_images(self):
-        deleted_images_count = 0
-        for sel_idx in list(self.selected_image_indices):
-            self.img_indices_order.pop(sel_idx - deleted_images_count)
-            self.image_labels.pop(sel_idx - deleted_images_count).grid_forget()
-            self.image_number_labels.pop(sel_idx - deleted_images_count).grid_forget()
-            deleted_images_count += 1
+        for sel_idx in sorted(self.selected_image_indices, reverse=True):
+            self.release_preview(self.img_indices_order.pop(sel_idx))
         
-        self.start_index_entry.configure(to=len(self.image_labels)+1)
+        self.start_index_entry.configure(to=len(self.img_indices_order)+1)
         self.selected_image_indices = set()
         self.display_images()
     
     def reverse_images(self):
         if len(self.selected_image_indices) in [0,1] :
             self.img_indices_order.reverse()
-            self.image_labels.reverse()
             self.display_images()
             return
         sorted_list = sorted(self.selected_image_indices)
         required_order = []
-        check = sorted_list[-2]
-        for idx in range(len(self.image_labels)):
+        for idx in range(len(self.img_indices_order)):
             if idx in sorted_list:
                 required_order.append(sorted_list[-(sorted_list.index(idx)+1)])
             else:
                 required_order.append(idx)
         self.img_indices_order = [self.img_indices_order[idx] for idx in required_order]
-        self.image_labels = [self.image_labels[idx] for idx in required_order]
         self.display_images()
     
     def on_done(self):
         self.master.store.images = [ self.master.store.images[idx] for idx in self.img_indices_order ]
         self.destroy()
     
-    def on_canvas_resize(self, event):
-        canvas_width = event.width
-        self.canvas.itemconfig(1, width=canvas_width)
-    
     def load_images(self, images):
-        for index, img_path in enumerate(images):
-            pil_img = open_image(img_path)
-            pil_img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            tk_img = ImageTk.PhotoImage(pil_img)
-            label = ctk.CTkLabel(master=self.scrollable_frame, image=tk_img, text="")
-            label.image = tk_img
-            label.bind("<Button-1>", lambda event, idx=index: self.on_click_image(event, idx))
-            # label.bind("<B1-Motion>", self.on_drag_image)
-            # label.bind("<ButtonRelease-1>", self.on_drop_image)
-            self.image_labels.append(label)
-            
-            num_label = ctk.CTkLabel(master=self.scrollable_frame, text=str(index + 1))
-            self.image_number_labels.append(num_label)
-        
-        self.start_index_entry.configure(to=index+2)
+        self.start_index_entry.configure(to=len(images)+1)
         self.display_images()
+    
+    def on_canvas_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_viewport_update()
+    
+    def schedule_viewport_update(self):
+        if self.viewport_job is None:
+            self.viewport_job = self.after_idle(self.update_viewport)
+    
+    def visible_rows(self):
+        rows = -(-len(self.img_indices_order) // self.columns)
+        top, bottom = self.canvas.yview()
+        first_row = int(top * rows * self.CELL_HEIGHT) // self.CELL_HEIGHT
+        last_row = min(rows - 1, int(bottom * rows * self.CELL_HEIGHT) // self.CELL_HEIGHT)
+        return first_row, last_row
+    
+    def update_viewport(self):
+        self.viewport_job = None
+        if self.columns is None:
+            return
+        first_row, last_row = self.visible_rows()
+        screen_rows = last_row - first_row + 1
+        
+        # load one screen above and below, drop previews three screens away
+        load_from = max(0, first_row - screen_rows) * self.columns
+        load_to = (last_row + 1 + screen_rows) * self.columns
+        keep_from = max(0, first_row - 3 * screen_rows) * self.columns
+        keep_to = (last_row + 1 + 3 * screen_rows) * self.columns
+        for index in self.img_indices_order[load_from:load_to]:
+            if index not in self.loaded_previews:
+                self.paint_preview(index)
+        kept = set(self.img_indices_order[keep_from:keep_to])
+        for index in list(self.loaded_previews):
+            if index not in kept:
+                self.release_preview(index)
+        
+        positions = range(first_row * self.columns, min(len(self.img_indices_order), (last_row + 1) * self.columns))
+        for position in list(self.visible_cells):
+            if position not in positions:
+                slot = self.visible_cells.pop(position)
+                for item in self.cell_items[slot]:
+                    self.canvas.itemconfigure(item, state="hidden")
+                self.slot_state[slot] = None
+                self.free_slots.append(slot)
+        for position in positions:
+            if position not in self.visible_cells:
+                self.visible_cells[position] = self.take_slot()
+            self.draw_cell(position)
+            
+    def take_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+        self.cell_items.append((
+            self.canvas.create_image(0, 0, state="hidden"),
+            self.canvas.create_rectangle(0, 0, 0, 0, outline=self.selection_color, width=5, state="hidden"),
+            self.canvas.create_text(0, 0, fill=self.text_color, state="hidden")
+        ))
+        self.slot_state.append(None)
+        return len(self.cell_items) - 1
+    
+    def draw_cell(self, position):
+        if position not in self.visible_cells:
+            return
+        slot = self.visible_cells[position]
+        tk_img = self.loaded_previews.get(self.img_indices_order[position], (self.placeholder,))[0]
+        state = (self.columns, tk_img, position in self.selected_image_indices)
+        # only cells whose place, picture or selection changed are redrawn
+        if self.slot_state[slot] == state:
+            return
+        self.slot_state[slot] = state
+        image_item, border_item, number_item = self.cell_items[slot]
+        row, col = divmod(position, self.columns)
+        x = col * self.CELL_WIDTH + self.CELL_WIDTH / 2
+        y = row * self.CELL_HEIGHT + 5 + self.TILE_SIZE / 2
+        half_width, half_height = tk_img.width() / 2, tk_img.height() / 2
+        
+        self.canvas.coords(image_item, x, y)
+        self.canvas.itemconfigure(image_item, image=tk_img, state="normal")
+        self.canvas.coords(border_item, x - half_width - 3, y - half_height - 3, x + half_width + 3, y + half_height + 3)
+        self.canvas.itemconfigure(border_item, state="normal" if position in self.selected_image_indices else "hidden")
+        self.canvas.coords(number_item, x, row * self.CELL_HEIGHT + self.TILE_SIZE + 25)
+        self.canvas.itemconfigure(number_item, text=str(position + 1), state="normal")
+    
+    def paint_preview(self, index):
+        # the tile shows the placeholder until the pool sends its preview
+        self.loaded_previews[index] = (self.placeholder, False)
+        self.thumbnails.request(index, self.master.store.images[index])
+    
+    def set_preview(self, index, tk_img, is_final):
+        self.loaded_previews[index] = (tk_img, is_final)
+        for position in self.visible_cells:
+            if self.img_indices_order[position] == index:
+                self.draw_cell(position)
+    
+    def release_preview(self, index):
+        self.loaded_previews.pop(index, None)
+        self.thumbnails.cancel(index)
+    
+    def drain_thumbnails(self):
+        # PhotoImages can only be made on the Tk thread, take ~30ms worth per
+        # tick so the window keeps handling events in between
+        started = time.monotonic()
+        while time.monotonic() - started < 0.03:
+            try:
+                index, size, data, is_final = self.thumbnails.results.get_nowait()
+            except queue.Empty:
+                break
+            # scrolled away, or an EXIF thumbnail arriving after the final preview
+            if index not in self.loaded_previews or self.loaded_previews[index][1]:
+                continue
+            self.set_preview(index, ImageTk.PhotoImage(Image.frombytes("RGB", size, data)), is_final)
+        self.drain_job = self.after(30, self.drain_thumbnails)
+    
+    def destroy(self):
+        if self.drain_job is not None:
+            self.after_cancel(self.drain_job)
+            self.drain_job = None
+        self.thumbnails.shutdown()
+        if self.viewport_job is not None:
+            self.after_cancel(self.viewport_job)
+            self.viewport_job = None
+        if self.resize_job is not None:
+            self.after_cancel(self.resize_job)
+            self.resize_job = None
+        super().destroy()
+
+    def on_click_canvas(self, event):
+        # hit-test the click against the cell grid instead of per-tile bindings
+        if self.columns is None:
+            return
+        x = self.canvas.canvasx(event.x)
+        y = self.canvas.canvasy(event.y)
+        col = int(x // self.CELL_WIDTH)
+        row = int(y // self.CELL_HEIGHT)
+        position = row * self.columns + col
+        if col >= self.columns or position >= len(self.img_indices_order):
+            return
+        if y - row * self.CELL_HEIGHT > self.TILE_SIZE + 10:
+            return
+        self.on_click_image(event, position)
 
     def on_click_image(self, event, idx): 
         ctrl_pressed = event.state & 0x0004 != 0
         shift_pressed = event.state & 0x0001 != 0
-        if event.widget.widgetName != 'label':
-            return
         
         if idx in self.selected_image_indices:
             self.deselect_label(idx)
@@ -863,168 +998,173 @@ class ImagesGrid(ctk.CTkToplevel):
 
 
     def display_images(self):
-        for label in self.image_labels:
-            label.grid_forget()
-        for num_label in self.image_number_labels:
-            num_label.grid_forget()
-        
-        row, col = 1, 0
-        for idx, label in enumerate(self.image_labels):
-            label.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
-            current_label = self.get_label(label)
-            current_label.bind("<Button-1>", lambda event, idx=idx: self.on_click_image(event, idx))
-            current_label.configure(borderwidth=5)
-            self.image_number_labels[idx].grid(row=row + 1, column=col, padx=5, pady=5)
-            self.image_number_labels[idx].configure(text=str(idx + 1))
-            col += 1
-            if (col * 300 + 150) >= self.winfo_width():
-                self.filled_col = col
-                col = 0
-                row += 2  # Increment by 2 to account for image number labels
-        if self.filled_col is None or col > self.filled_col:
-            self.filled_col = col
-        self.action_frame.grid(row=0, column=0, columnspan=self.filled_col, padx=10, pady=20, sticky=ctk.EW)
+        self.columns = max(1, self.canvas.winfo_width() // self.CELL_WIDTH)
+        rows = -(-len(self.img_indices_order) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.CELL_WIDTH, rows * self.CELL_HEIGHT))
+        self.update_viewport()
 
     def on_resize(self, event):
-        
-        if ( self.filled_col is None or 
-            ((self.filled_col) * 300 < self.winfo_width()) or
-            ((self.filled_col - 1) * 300 > self.winfo_width())
-            ):
+        # a drag-resize sends a burst of events, relayout once it settles
+        if self.resize_job is not None:
+            self.after_cancel(self.resize_job)
+        self.resize_job = self.after(150, self.on_resize_done)
+
+    def on_resize_done(self):
+        self.resize_job = None
+        if self.columns != max(1, self.canvas.winfo_width() // self.CELL_WIDTH):
             self.display_images()
+        else:
+            self.schedule_viewport_update()
 
 class FinalFrame(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
         self.master = master
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        self.poll_id = None
+        self.error = None
+        self.save_results = queue.Queue()
+        self.save_poll_id = None
         self.render_widgets()
         self.process_images()
 
-    def secure_random_number(self, start, end):
-        return secrets.randbelow(end - start) + start
-    
     def process_images(self):
-        last_datetime = self.master.store.datetime.replace(second=self.secure_random_number(0, 60))
-        for image_path in self.master.store.images:
-            image = open_image(image_path)
-            date = last_datetime
-            last_datetime = self.get_rand_datetime(last_datetime)
-            latitude = self.randomize_last_three_decimals(abs(self.master.store.latitude_deg))
-            longitude = self.randomize_last_three_decimals(abs(self.master.store.longitude_deg))
-            
-            self.imprint_info_on_image(
-                image=image,
-                date=date.strftime("%d %b %Y  %H:%M:%S"),
-                latitude=f"{latitude}{self.master.store.latitude_ref}",
-                longitude=f"{longitude}{self.master.store.longitude_ref}",
-                address=self.master.store.address,
-                pic_name=self.master.store.pic_name,
-                filepath=image_path,
-                corner=self.master.store.corner,
-                font_s=self.master.store.font_size
+        store = self.master.store
+        max_bytes = store.max_kilobytes * 1024 if store.max_kilobytes else None
+        max_edge = store.max_edge or None
+        clashes = name_clashes(
+            store.images,
+            lambda path: job_output_name(path, store.encoder_profile, store.stamp_text, max_bytes, max_edge)
+        )
+        if clashes:
+            self.cancel_btn.configure(state=ctk.DISABLED)
+            self.status_label.configure(
+                text="These images would be saved under the same name:\n" + "\n".join(", ".join(paths) for paths in clashes.values())
             )
-            exif_bytes = self.build_exif_bytes(dt=date, latitude=latitude, longitude=longitude)
-            self.master.store.insert_final_image(image_path=image_path, image=image, exif_bytes=exif_bytes)
-        self.master.configure(cursor="")
-        self.download_btn.configure(state=ctk.NORMAL)
+            return
+        jobs = plan_jobs(
+            image_paths=store.images,
+            start=store.datetime,
+            latitude_deg=store.latitude_deg,
+            longitude_deg=store.longitude_deg,
+            latitude_ref=store.latitude_ref,
+            longitude_ref=store.longitude_ref,
+            address=store.address,
+            pic_name=store.pic_name,
+            corner=store.corner,
+            font_s=store.font_size,
+            from_minutes=store.from_minutes,
+            to_minutes=store.to_minutes,
+            font_path=store.font_path,
+            output_dir=store.output_dir,
+            stamp_text=store.stamp_text,
+            profile=store.encoder_profile,
+            max_bytes=max_bytes,
+            max_edge=max_edge
+        )
+        self.total_images = len(jobs)
+        self.processed_images = 0
+        self.encoded_bytes = 0
+        self.encode_seconds = 0.0
+        self.spliced_images = 0
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.started_at = time.monotonic()
+        self.worker = threading.Thread(target=self.run_batch, args=(jobs, store.workers), daemon=True)
+        self.worker.start()
+        self.poll_id = self.after(100, self.poll_results)
     
-    def randomize_last_three_decimals(self, value):
-        value_str = f"{value:.8f}"
-        whole_part, decimal_part = value_str.split('.')
-        first_five_decimals = decimal_part[:5]
-        last_three_random = f"{self.secure_random_number(0, 999):03d}"
-        new_value_str = f"{whole_part}.{first_five_decimals}{last_three_random}"
-        return float(new_value_str)
+    def run_batch(self, jobs, workers):
+        # runs on the worker thread, the UI is only touched from poll_results
+        batch = process_batch(jobs, max_workers=workers)
+        try:
+            for final_image in batch:
+                if self.cancel_event.is_set():
+                    break
+                self.results.put(("image", final_image))
+        except Exception as e:
+            self.results.put(("error", e))
+        finally:
+            batch.close()
+            self.results.put(("done", None))
     
-    def get_rand_datetime(self, last):
-        random_minutes = self.secure_random_number(self.master.store.from_minutes, self.master.store.to_minutes)
-        random_seconds = self.secure_random_number(0, 60)
-        return last.replace(second=random_seconds) + timedelta(minutes=random_minutes)
+    def poll_results(self):
+        self.poll_id = None
+        while True:
+            try:
+                kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "image":
+                self.master.store.insert_final_image(value)
+                self.processed_images += 1
+                self.encoded_bytes += value.encoded_bytes
+                # spliced JPEGs never went through the profile's encoder
+                if is_exif_only(value.image_path, self.master.store.stamp_text, self.max_bytes, self.max_edge):
+                    self.spliced_images += 1
+                else:
+                    self.encode_seconds += value.encode_seconds
+            elif kind == "error":
+                self.error = value
+            else:
+                self.on_batch_done()
+                return
+        if not self.cancel_event.is_set():
+            self.update_progress()
+        self.poll_id = self.after(100, self.poll_results)
     
-    def imprint_info_on_image(self, image, date, latitude, longitude, address, filepath, pic_name, corner, font_s):
-        text = f"{date}\n{latitude} {longitude}\n{address}"
-        if pic_name is not None and pic_name != "":
-            text += f"\n{pic_name}"
-        width, height = image.size
-
-        ratio = 8 / 7
-        if (width / height) > 1.25:
-            ratio = 5 / 7
-        if (height / width) > 1.4:
-            ratio = 10 / 7
-
-        long_line = max(text.split("\n"), key=len)
-        font_size = int((width / len(long_line)) * ratio)
-        font = ImageFont.truetype("arial.ttf", font_size)
-        
-        draw = ImageDraw.Draw(image)
-        text_width = draw.textlength(long_line, font=font)
-        
-        while text_width > width - 20:  
-            font_size -= 1
-            font = ImageFont.truetype("arial.ttf", font_size)
-            text_width = draw.textlength(long_line, font=font)
-        
-        if(font_s != 0):
-            font = ImageFont.truetype("arial.ttf", font_s)
-
-        text_block_height = font.size * len(text.split("\n"))
-        if corner == Corner.TOP_LEFT:
-            position = (10, 10)
-        elif corner == Corner.TOP_RIGHT:
-            position = (width - text_width - 10, 10)
-        elif corner == Corner.BOTTOM_LEFT:
-            position = (10, height - text_block_height - 10)
+    def update_progress(self):
+        elapsed = time.monotonic() - self.started_at
+        rate = self.processed_images / elapsed if elapsed > 0 else 0
+        if rate > 0:
+            eta = int((self.total_images - self.processed_images) / rate)
+            eta_text = f"{eta // 60:02}:{eta % 60:02}"
         else:
-            position = (width - text_width - 10, height - text_block_height - 10)
-        # position = (10, height - text_block_height - 10)
-        
-        # rectangle_position = (position[0] - 10, position[1] - 10, position[0] + text_width + 10, position[1] + text_block_height + 10)
-        # rectangle = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        # rectangle_draw = ImageDraw.Draw(rectangle)
-        # rectangle_draw.rectangle(rectangle_position, fill=(0, 0, 0, 64)) 
-        # image.paste(rectangle, mask=rectangle)
-        
-        lines = text.split("\n")
-        y_text = position[1]
-        for line in lines:
-            line_width = draw.textlength(line, font=font)
-            line_height = font.size
-            if corner in [Corner.TOP_RIGHT, Corner.BOTTOM_RIGHT]:
-                x_text = width - line_width - 10
-            else:
-                x_text = position[0]
-            draw.text((x_text, y_text), line, font=font, fill="white")
-            y_text += line_height
-        
-        # draw.text(position, text, font=font, fill="white")
+            eta_text = "--:--"
+        self.progress_bar.set(self.processed_images / max(self.total_images, 1))
+        self.status_label.configure(
+            text=f"{self.processed_images}/{self.total_images} images  ·  {rate:.1f} img/s  ·  ETA {eta_text}"
+        )
     
-    def build_exif_bytes(self, dt, latitude, longitude):
-        exif_dict = {
-            "0th": {},
-            "Exif": {},
-            "GPS": {}
-        }
-        def to_deg(value):
-            deg = int(value)
-            min = int((value - deg) * 60)
-            sec = int((value - deg - min/60) * 3600)
-            return (deg, min, sec)
-        lat = to_deg(latitude)
-        lon = to_deg(longitude)
-        
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = self.master.store.latitude_ref.encode('utf-8')
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = [(lat[0], 1), (lat[1], 1), (lat[2], 1)]
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitudeRef] = self.master.store.longitude_ref.encode('utf-8')
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = [(lon[0], 1), (lon[1], 1), (lon[2], 1)]
-
-        date_str = dt.strftime('%Y:%m:%d %H:%M:%S')
-        exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_str.encode('utf-8')
-        exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_str.encode('utf-8')
-        exif_dict["0th"][piexif.ImageIFD.DateTime] = date_str.encode('utf-8')
-        
-        exif_bytes = piexif.dump(exif_dict)
-        return exif_bytes
+    def on_batch_done(self):
+        self.cancel_btn.configure(state=ctk.DISABLED)
+        if self.error is not None:
+            self.status_label.configure(text=f"Processing failed: {self.error}")
+            return
+        if self.processed_images < self.total_images:
+            self.status_label.configure(text=f"Cancelled after {self.processed_images}/{self.total_images} images")
+            return
+        self.update_progress()
+        encoded_images = self.processed_images - self.spliced_images
+        details = []
+        if encoded_images:
+            details.append(
+                f"{self.master.store.encoder_profile}: {self.encode_seconds * 1000 / encoded_images:.0f} ms encode per image"
+            )
+        if self.spliced_images:
+            details.append(f"{self.spliced_images} JPEGs with only their EXIF replaced")
+        encode_summary = f"{self.encoded_bytes / 1024 / 1024:.1f} MB, " + ", ".join(details)
+        if self.master.store.output_dir is not None:
+            self.status_label.configure(text=f"Saved {self.processed_images} images to {self.master.store.output_dir}\n{encode_summary}")
+            return
+        self.status_label.configure(text=f"{self.processed_images} images ready  ·  {encode_summary}")
+        self.download_btn.configure(state=ctk.NORMAL)
+    
+    def cancel(self):
+        self.cancel_event.set()
+        self.cancel_btn.configure(state=ctk.DISABLED)
+        self.status_label.configure(text="Cancelling...")
+    
+    def destroy(self):
+        self.cancel_event.set()
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
+        if self.save_poll_id is not None:
+            self.after_cancel(self.save_poll_id)
+            self.save_poll_id = None
+        super().destroy()
     
     def display_image(self, image):
         (width, height) = image.size
@@ -1035,21 +1175,87 @@ class FinalFrame(ctk.CTkFrame):
     
     def save_images(self):
         selected_folder = filedialog.askdirectory(title="Select Folder to save images")
-        if selected_folder:
-            for fi in self.master.store.get_final_images():
-                save_path = f"{selected_folder}/{os.path.basename(fi.image_path)}"
-                fi.image.save(save_path, quality=100, exif_bytes=fi.exif_bytes)
-            
-            
+        if not selected_folder:
+            return
+        final_images = self.master.store.get_final_images()
+        self.download_btn.configure(state=ctk.DISABLED)
+        self.saved_images = 0
+        self.save_total = len(final_images)
+        self.save_error = None
+        self.save_folder = selected_folder
+        self.progress_bar.set(0)
+        self.saver = threading.Thread(
+            target=self.run_save,
+            args=(final_images, selected_folder, self.master.store.workers),
+            daemon=True
+        )
+        self.saver.start()
+        self.save_poll_id = self.after(100, self.poll_saves)
+    
+    def run_save(self, final_images, folder, workers):
+        # runs on the saver thread, files are written by the pool in write_images
+        writes = write_images(final_images, folder, max_workers=workers)
+        try:
+            for output_path in writes:
+                if self.cancel_event.is_set():
+                    break
+                self.save_results.put(("saved", output_path))
+        except Exception as e:
+            self.save_results.put(("error", e))
+        finally:
+            writes.close()
+            self.save_results.put(("done", None))
+    
+    def poll_saves(self):
+        self.save_poll_id = None
+        while True:
+            try:
+                kind, value = self.save_results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "saved":
+                self.saved_images += 1
+                self.progress_bar.set(self.saved_images / max(self.save_total, 1))
+                self.status_label.configure(
+                    text=f"Saved {self.saved_images}/{self.save_total}  ·  {os.path.basename(value)}"
+                )
+            elif kind == "error":
+                self.save_error = value
+            else:
+                self.on_save_done()
+                return
+        self.save_poll_id = self.after(100, self.poll_saves)
+    
+    def on_save_done(self):
+        self.download_btn.configure(state=ctk.NORMAL)
+        if self.save_error is not None:
+            self.status_label.configure(text=f"Saving failed after {self.saved_images} images: {self.save_error}")
+            return
+        self.status_label.configure(text=f"Saved {self.saved_images} images to {self.save_folder}")
     
     def render_widgets(self):
+        self.status_label = ctk.CTkLabel(master=self, text="Starting...")
+        self.status_label.place(relx=0.5, rely=0.34, anchor=ctk.CENTER)
+        
+        self.progress_bar = ctk.CTkProgressBar(master=self)
+        self.progress_bar.set(0)
+        self.progress_bar.place(relx=0.5, rely=0.4, anchor=ctk.CENTER)
+        
         self.download_btn = ctk.CTkButton(
             master=self,
             text="Download Images",
             command=self.save_images,
             state=ctk.DISABLED
         )
-        self.download_btn.place(relx=0.5, rely=0.5, anchor= ctk.CENTER)
+        if self.master.store.output_dir is None:
+            self.download_btn.place(relx=0.5, rely=0.5, anchor= ctk.CENTER)
+        
+        self.cancel_btn = ctk.CTkButton(
+            master=self,
+            text="Cancel",
+            command=self.cancel
+        )
+        self.cancel_btn.place(relx=0.5, rely=0.58, anchor=ctk.CENTER)
 
 class App(ctk.CTk, TkinterDnD.DnDWrapper):
     
@@ -1117,5 +1323,6 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.final_frame.pack(expand=True, fill="both", padx=40, pady=40)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,10 @@
+# The image pipeline without any GUI: the Tk front ends and the command line
+# (python -m imgeo) both build on it, and nothing here may import tkinter.
+from .models import LatitudeRef, LongitudeRef, Corner, FinalImage
+from .imaging import open_image, orient_image, load_thumbnail, load_exif_thumbnail
+from .layout import TextLayout, get_text_layout
+from .stamp import imprint_info_on_image
+from .exif import build_exif_bytes, insert_exif, read_orientation, to_dms
+from .encode import EncoderProfile, ENCODER_PROFILES, DEFAULT_PROFILE, encode_image, encode_within_budget, output_name, is_jpeg
+from .processing import ImageJob, process_image, process_batch
+from .plan import PlanRecord, plan_metadata, jobs_from_plan, plan_jobs, write_plan_csv
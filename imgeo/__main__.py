@@ -0,0 +1,7 @@
+import sys
+import multiprocessing
+from imgeo.cli import main
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import datetime
+from .models import Corner, LatitudeRef, LongitudeRef
+from .plan import plan_metadata, jobs_from_plan, write_plan_csv
+from .processing import process_batch, is_exif_only, job_output_name
+from .encode import ENCODER_PROFILES, DEFAULT_PROFILE
+from .writer import name_clashes
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+CORNERS = {
+    "top-left": Corner.TOP_LEFT,
+    "top-right": Corner.TOP_RIGHT,
+    "bottom-left": Corner.BOTTOM_LEFT,
+    "bottom-right": Corner.BOTTOM_RIGHT
+}
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+def collect_images(inputs):
+    # folders are taken as all their images, anything else as a glob pattern,
+    # in the order given and without duplicates
+    images = []
+    seen = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths = sorted(os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            paths = sorted(glob.glob(pattern))
+        for path in paths:
+            if os.path.isfile(path) and is_image(path) and path not in seen:
+                seen.add(path)
+                images.append(path)
+    return images
+
+def is_input_folder(folder, paths):
+    if not os.path.isdir(folder):
+        return False
+    folders = {os.path.dirname(path) or "." for path in paths}
+    return any(os.path.samefile(folder, input_folder) for input_folder in folders)
+
+def parse_datetime(value):
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD HH:MM, got {value!r}")
+
+def parse_size(value):
+    # bytes, or with a K/M suffix
+    units = {"K": 1024, "M": 1024 * 1024}
+    multiplier = units.get(value[-1:].upper(), 1)
+    number = value[:-1] if multiplier != 1 else value
+    try:
+        size = int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size like 500000, 500K or 2M, got {value!r}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError("the size must be positive")
+    return size
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="imgeo",
+        description="Stamp date, coordinates and address on photos and write them to a folder."
+    )
+    parser.add_argument("inputs", nargs="+", help="image files, glob patterns or folders")
+    parser.add_argument("-o", "--output", help="folder to write the processed images to")
+    parser.add_argument("--date", required=True, type=parse_datetime, help="time of the first photo, YYYY-MM-DD HH:MM")
+    parser.add_argument("--lat", required=True, type=float, help="latitude in degrees, negative for south")
+    parser.add_argument("--lon", required=True, type=float, help="longitude in degrees, negative for west")
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--name", default=None, help="optional line stamped below the address")
+    parser.add_argument("--corner", choices=list(CORNERS), default="bottom-right")
+    parser.add_argument("--font", default=None, help="TTF/OTF file to stamp with")
+    parser.add_argument("--font-size", type=int, default=0, help="0 fits the text to the image width")
+    parser.add_argument("--from-minutes", type=int, default=1, help="least minutes between two photos")
+    parser.add_argument("--to-minutes", type=int, default=2, help="most minutes between two photos")
+    parser.add_argument("--profile", choices=list(ENCODER_PROFILES), default=DEFAULT_PROFILE,
+                        help="encoder settings: max (quality 100), archive (q95 4:4:4), fast (q85 4:2:0), web (progressive, optimized q80) or webp")
+    parser.add_argument("--max-bytes", type=parse_size, default=None,
+                        help="size budget per image (e.g. 800K), the highest quality that fits is picked")
+    parser.add_argument("--max-edge", type=int, default=None, metavar="PX",
+                        help="downscale so the long edge is at most PX before stamping")
+    parser.add_argument("--exif-only", action="store_true", help="only write EXIF, keep the original JPEG pixels")
+    parser.add_argument("--export-plan", metavar="CSV", help="also write each photo's planned time and coordinates to CSV")
+    parser.add_argument("--plan-only", action="store_true", help="print the plan as CSV and exit without touching any image")
+    parser.add_argument("--in-place", action="store_true", help="allow -o to be a folder the images are read from, replacing them")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes, 0 uses every core")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # a windowed build has no console to report to
+    if sys.stderr is None:
+        args.quiet = True
+    if abs(args.lat) > 90 or abs(args.lon) > 180:
+        print("imgeo: --lat must be within 90 and --lon within 180 degrees", file=sys.stderr)
+        return 2
+    if args.output is None and not args.plan_only:
+        print("imgeo: -o/--output is required unless --plan-only is given", file=sys.stderr)
+        return 2
+    if args.exif_only and (args.max_bytes is not None or args.max_edge is not None):
+        print("imgeo: --max-bytes and --max-edge re-encode the image, they can't be combined with --exif-only", file=sys.stderr)
+        return 2
+    if args.max_edge is not None and args.max_edge <= 0:
+        print("imgeo: --max-edge must be positive", file=sys.stderr)
+        return 2
+    if args.workers < 0 or args.font_size < 0:
+        print("imgeo: --workers and --font-size must not be negative", file=sys.stderr)
+        return 2
+    if args.to_minutes < args.from_minutes:
+        print("imgeo: --to-minutes must not be less than --from-minutes", file=sys.stderr)
+        return 2
+
+    images = collect_images(args.inputs)
+    if not images:
+        print("imgeo: no .jpg, .jpeg or .png images found", file=sys.stderr)
+        return 1
+
+    records = plan_metadata(
+        image_paths=images,
+        start=args.date,
+        latitude_deg=args.lat,
+        longitude_deg=args.lon,
+        latitude_ref=(LatitudeRef.S if args.lat < 0 else LatitudeRef.N).value,
+        longitude_ref=(LongitudeRef.W if args.lon < 0 else LongitudeRef.E).value,
+        from_minutes=args.from_minutes,
+        to_minutes=args.to_minutes
+    )
+    if args.export_plan is not None:
+        with open(args.export_plan, "w", newline="", encoding="utf-8") as f:
+            write_plan_csv(records, f)
+    if args.plan_only:
+        write_plan_csv(records, sys.stdout)
+        return 0
+
+    clashes = name_clashes(
+        images,
+        lambda path: job_output_name(path, args.profile, not args.exif_only, args.max_bytes, args.max_edge)
+    )
+    if clashes:
+        print("imgeo: these images would be written to the same output file:", file=sys.stderr)
+        for paths in clashes.values():
+            print("  " + ", ".join(paths), file=sys.stderr)
+        return 2
+    if not args.in_place and is_input_folder(args.output, images):
+        print("imgeo: -o is a folder the images are read from, pass --in-place to replace them", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    jobs = jobs_from_plan(
+        records,
+        address=args.address,
+        pic_name=args.name,
+        corner=CORNERS[args.corner],
+        font_s=args.font_size,
+        font_path=args.font,
+        output_dir=args.output,
+        stamp_text=not args.exif_only,
+        profile=args.profile,
+        max_bytes=args.max_bytes,
+        max_edge=args.max_edge
+    )
+    started_at = time.monotonic()
+    total_bytes = 0
+    encode_seconds = 0.0
+    spliced = 0
+    over_budget = 0
+    for count, final_image in enumerate(process_batch(jobs, max_workers=args.workers), start=1):
+        total_bytes += final_image.encoded_bytes
+        # spliced JPEGs never went through the profile's encoder
+        if is_exif_only(final_image.image_path, not args.exif_only, args.max_bytes, args.max_edge):
+            spliced += 1
+        else:
+            encode_seconds += final_image.encode_seconds
+        if args.max_bytes is not None and final_image.encoded_bytes > args.max_bytes:
+            over_budget += 1
+        if not args.quiet:
+            quality = f" q{final_image.quality}" if final_image.quality is not None else ""
+            print(
+                f"[{count}/{len(jobs)}] {final_image.output_path}  "
+                f"{final_image.encoded_bytes / 1024:.0f} KB{quality} in {final_image.encode_seconds * 1000:.0f} ms",
+                file=sys.stderr
+            )
+    if over_budget:
+        print(f"imgeo: {over_budget} images are still over --max-bytes, at quality 1 or in a format without a quality setting (PNG)", file=sys.stderr)
+    if not args.quiet:
+        elapsed = time.monotonic() - started_at
+        encoded = len(jobs) - spliced
+        details = []
+        if encoded:
+            details.append(f"profile {args.profile}, {encode_seconds * 1000 / encoded:.0f} ms encode per image")
+        if spliced:
+            details.append(f"{spliced} JPEGs with only their EXIF replaced")
+        print(
+            f"Saved {len(jobs)} images to {args.output} in {elapsed:.1f}s: "
+            f"{total_bytes / 1024 / 1024:.1f} MB, " + ", ".join(details),
+            file=sys.stderr
+        )
+    return 0
@@ -0,0 +1,86 @@
+import os
+import io
+from typing import Dict
+from PIL import Image
+
+class EncoderProfile:
+    name: str
+    image_format: str
+    options: Dict[str, object]
+
+    def __init__(self, name: str, image_format: str, options: Dict[str, object]):
+        self.name = name
+        # None keeps the format of the source file
+        self.image_format = image_format
+        # save() options for JPEG and WebP output, other formats use Pillow's defaults
+        self.options = options
+
+ENCODER_PROFILES = {
+    # the fixed setting every batch used before profiles existed
+    "max": EncoderProfile("max", None, {"quality": 100}),
+    "archive": EncoderProfile("archive", None, {"quality": 95, "subsampling": 0}),
+    "fast": EncoderProfile("fast", None, {"quality": 85, "subsampling": 2, "optimize": False}),
+    "web": EncoderProfile("web", None, {"quality": 80, "subsampling": 2, "progressive": True, "optimize": True}),
+    "webp": EncoderProfile("webp", "WEBP", {"quality": 80, "method": 4})
+}
+DEFAULT_PROFILE = "max"
+FORMAT_EXTENSIONS = {"WEBP": ".webp"}
+# formats whose size the quality setting controls
+QUALITY_FORMATS = ("JPEG", "WEBP")
+
+def output_format(image_path, profile: str = DEFAULT_PROFILE):
+    extension = os.path.splitext(image_path)[1].lower()
+    return ENCODER_PROFILES[profile].image_format or Image.registered_extensions()[extension]
+
+def output_name(image_path, profile: str = DEFAULT_PROFILE):
+    # the output keeps the source's name, and its extension unless the
+    # profile changes the format
+    name, extension = os.path.splitext(os.path.basename(image_path))
+    image_format = ENCODER_PROFILES[profile].image_format
+    return name + FORMAT_EXTENSIONS.get(image_format, extension)
+
+def encode_image(image, image_path, exif_bytes, profile: str = DEFAULT_PROFILE, quality: int = None):
+    image_format = output_format(image_path, profile)
+    options = {}
+    if image_format in QUALITY_FORMATS:
+        options = dict(ENCODER_PROFILES[profile].options)
+        if quality is not None:
+            options["quality"] = quality
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, exif=exif_bytes, **options)
+    return buffer.getvalue()
+
+def profile_quality(image_path, profile: str = DEFAULT_PROFILE):
+    if output_format(image_path, profile) not in QUALITY_FORMATS:
+        return None
+    # Pillow's default when a profile doesn't set one
+    return ENCODER_PROFILES[profile].options.get("quality", 75)
+
+def encode_within_budget(image, image_path, exif_bytes, max_bytes: int, profile: str = DEFAULT_PROFILE):
+    # Highest quality up to the profile's own whose output fits max_bytes,
+    # bisected over in-memory encodes, about 7 for the whole 1-100 range. If
+    # even quality 1 doesn't fit, that smallest encode is returned and the
+    # caller sees encoded size > max_bytes.
+    top = profile_quality(image_path, profile)
+    data = encode_image(image, image_path, exif_bytes, profile)
+    if top is None or len(data) <= max_bytes:
+        return data, top
+
+    low, high = 1, top - 1
+    best = None
+    smallest = data, top
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode_image(image, image_path, exif_bytes, profile, quality=quality)
+        if len(data) <= max_bytes:
+            best = data, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+            if len(data) < len(smallest[0]):
+                smallest = data, quality
+    return best or smallest
+
+def is_jpeg(image_path):
+    extension = os.path.splitext(image_path)[1].lower()
+    return Image.registered_extensions().get(extension) == "JPEG"
@@ -0,0 +1,158 @@
+import struct
+from fractions import Fraction
+from functools import lru_cache
+from typing import Tuple
+import piexif
+
+# coordinates are planned as integers in units of 1e-8 degrees, the
+# precision they're stamped with
+COORD_SCALE = 10 ** 8
+
+# placeholders the EXIF template is dumped with, piexif writes big-endian
+DATE_SENTINEL = b"YYYY:MM:DD HH:MM:SS"
+DMS_SENTINEL = 0x5EA1ED00
+
+def to_units(value):
+    # exact, rounds like f"{value:.8f}" does
+    return round(Fraction(value) * COORD_SCALE)
+
+def dms_from_units(units):
+    deg, rest = divmod(units, COORD_SCALE)
+    min, rest = divmod(rest * 60, COORD_SCALE)
+    sec = rest * 60 // COORD_SCALE
+    return (deg, min, sec)
+
+def to_dms(value):
+    return dms_from_units(to_units(value))
+
+def dump_exif(date_bytes, latitude_dms, longitude_dms, latitude_ref, longitude_ref, orientation=None):
+    exif_dict = {
+        "0th": {},
+        "Exif": {},
+        "GPS": {}
+    }
+    lat = latitude_dms
+    lon = longitude_dms
+
+    exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = latitude_ref.encode('utf-8')
+    exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = [(lat[0], 1), (lat[1], 1), (lat[2], 1)]
+    exif_dict["GPS"][piexif.GPSIFD.GPSLongitudeRef] = longitude_ref.encode('utf-8')
+    exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = [(lon[0], 1), (lon[1], 1), (lon[2], 1)]
+
+    exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_bytes
+    exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_bytes
+    exif_dict["0th"][piexif.ImageIFD.DateTime] = date_bytes
+    if orientation is not None:
+        exif_dict["0th"][piexif.ImageIFD.Orientation] = orientation
+
+    exif_bytes = piexif.dump(exif_dict)
+    return exif_bytes
+
+class ExifTemplate:
+    data: bytes
+    date_offsets: Tuple[int, ...]
+    dms_offsets: Tuple[int, ...]
+
+    def __init__(self, data: bytes, date_offsets: Tuple[int, ...], dms_offsets: Tuple[int, ...]):
+        self.data = data
+        self.date_offsets = date_offsets
+        self.dms_offsets = dms_offsets
+
+def find_all(data, needle):
+    offsets = []
+    offset = data.find(needle)
+    while offset != -1:
+        offsets.append(offset)
+        offset = data.find(needle, offset + 1)
+    return offsets
+
+@lru_cache(maxsize=64)
+def get_exif_template(latitude_ref, longitude_ref, orientation=None):
+    # The IFDs piexif.dump lays out only depend on which tags are present and
+    # their sizes, refs and orientation are stored inline. Dumping once with
+    # sentinel values finds where the date strings and the six GPS numerators
+    # land, every other image of the batch just overwrites them.
+    sentinels = [DMS_SENTINEL + i for i in range(6)]
+    data = dump_exif(DATE_SENTINEL, sentinels[:3], sentinels[3:], latitude_ref, longitude_ref, orientation)
+    date_offsets = find_all(data, DATE_SENTINEL)
+    dms_offsets = [find_all(data, struct.pack(">L", sentinel)) for sentinel in sentinels]
+    if len(date_offsets) != 3 or any(len(offsets) != 1 for offsets in dms_offsets):
+        return None
+    return ExifTemplate(data, tuple(date_offsets), tuple(offsets[0] for offsets in dms_offsets))
+
+def build_exif_bytes(dt, latitude_dms, longitude_dms, latitude_ref, longitude_ref, orientation=None):
+    date_bytes = dt.strftime('%Y:%m:%d %H:%M:%S').encode('utf-8')
+    template = get_exif_template(latitude_ref, longitude_ref, orientation)
+    dms = tuple(latitude_dms) + tuple(longitude_dms)
+    # anything that would change the layout goes through piexif itself
+    if template is None or len(date_bytes) != len(DATE_SENTINEL) or not all(0 <= value < 2 ** 32 for value in dms):
+        return dump_exif(date_bytes, latitude_dms, longitude_dms, latitude_ref, longitude_ref, orientation)
+    data = bytearray(template.data)
+    for offset in template.date_offsets:
+        data[offset:offset + len(date_bytes)] = date_bytes
+    for offset, value in zip(template.dms_offsets, dms):
+        struct.pack_into(">L", data, offset, value)
+    return bytes(data)
+
+def jpeg_segments(data):
+    # (start, end) of the marker segments between SOI and SOS, the walk never
+    # touches the compressed image data that follows
+    if data[0:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG stream")
+    segments = []
+    head = 2
+    while data[head:head + 2] != b"\xff\xda":
+        if head + 4 > len(data):
+            raise ValueError("JPEG stream ends before the image data")
+        length = struct.unpack_from(">H", data, head + 2)[0]
+        segments.append((head, head + 2 + length))
+        head += 2 + length
+    return segments
+
+def is_app0(data, segment):
+    return data[segment[0]:segment[0] + 2] == b"\xff\xe0"
+
+def is_exif_segment(data, segment):
+    start = segment[0]
+    return data[start:start + 2] == b"\xff\xe1" and data[start + 4:start + 10] == b"Exif\x00\x00"
+
+def find_exif_segment(data):
+    for segment in jpeg_segments(data):
+        if is_exif_segment(data, segment):
+            return segment
+    return None
+
+def read_exif(data):
+    # only the APP1 payload goes to piexif, from "Exif\0\0" on, so a mapped
+    # file is never copied whole
+    segment = find_exif_segment(data)
+    if segment is None:
+        return None
+    start, end = segment
+    return piexif.load(bytes(data[start + 4:end]))
+
+def read_orientation(data):
+    try:
+        exif = read_exif(data)
+    except (ValueError, KeyError, struct.error):
+        return None
+    if exif is None:
+        return None
+    return exif["0th"].get(piexif.ImageIFD.Orientation)
+
+def insert_exif(exif_bytes, data):
+    # Splices the EXIF segment into the JPEG stream in `data` (bytes or a
+    # mapped file) the way piexif.insert does: an existing Exif APP1 is
+    # replaced and a leading APP0 dropped, or else the APP0 is replaced. The
+    # output is joined straight from slices of `data`, one copy in total.
+    if exif_bytes[0:6] != b"Exif\x00\x00":
+        raise ValueError("Given data is not exif data")
+    segment = b"\xff\xe1" + struct.pack(">H", len(exif_bytes) + 2) + exif_bytes
+    segments = jpeg_segments(data)
+    cut_start = cut_end = 2
+    if len(segments) >= 2 and is_app0(data, segments[0]) and is_exif_segment(data, segments[1]):
+        cut_start, cut_end = segments[0][0], segments[1][1]
+    elif segments and (is_app0(data, segments[0]) or is_exif_segment(data, segments[0])):
+        cut_start, cut_end = segments[0]
+    with memoryview(data) as view:
+        return b"".join((view[:cut_start], segment, view[cut_end:]))
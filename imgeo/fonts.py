@@ -0,0 +1,74 @@
+from functools import lru_cache
+from PIL import ImageFont
+
+DEFAULT_FONT = "arial.ttf"
+# tried in order when the configured font can't be opened, Pillow also looks
+# them up in the system font folders
+FALLBACK_FONTS = ["arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Helvetica.ttc"]
+
+@lru_cache(maxsize=None)
+def resolve_font_path(font_path: str = None):
+    candidates = [font_path or DEFAULT_FONT] + FALLBACK_FONTS
+    for candidate in candidates:
+        try:
+            ImageFont.truetype(candidate, 10)
+            return candidate
+        except OSError:
+            continue
+    return None
+
+@lru_cache(maxsize=256)
+def get_font(font_path: str, size: int):
+    # Cached per process, so every image a worker handles reuses the parsed
+    # font instead of reopening the TTF for each size it tries.
+    resolved = resolve_font_path(font_path)
+    if resolved is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(resolved, size)
+
+def fit_font_size(draw, text, start_size: int, max_width: float, font_path: str = None):
+    # Largest size <= start_size whose `text` fits in max_width, the same size
+    # stepping down one point at a time finds. The width at start_size gives a
+    # linear estimate, which is then corrected by galloping to a bracket and
+    # bisecting it, so only O(log n) sizes are measured.
+    def measure(size):
+        return draw.textlength(text, font=get_font(font_path, size))
+
+    # a tiny image or a long line can estimate a size of 0, which FreeType rejects
+    start_size = max(1, start_size)
+    text_width = measure(start_size)
+    if text_width <= max_width or start_size <= 1:
+        return start_size, text_width
+
+    estimate = max(1, min(start_size - 1, int(start_size * max_width / text_width)))
+    estimate_width = measure(estimate)
+    if estimate_width <= max_width:
+        low, low_width, high = estimate, estimate_width, start_size
+        step = 1
+        while low + step < high:
+            width = measure(low + step)
+            if width > max_width:
+                high = low + step
+                break
+            low, low_width = low + step, width
+            step *= 2
+    else:
+        high, low, low_width = estimate, None, None
+        step = 1
+        while low is None:
+            size = max(1, high - step)
+            width = measure(size)
+            if width <= max_width or size == 1:
+                low, low_width = size, width
+            else:
+                high = size
+                step *= 2
+
+    while high - low > 1:
+        middle = (low + high) // 2
+        width = measure(middle)
+        if width <= max_width:
+            low, low_width = middle, width
+        else:
+            high = middle
+    return low, low_width
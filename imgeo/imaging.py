@@ -0,0 +1,82 @@
+from PIL import Image, ImageOps, ExifTags, UnidentifiedImageError
+import piexif
+import io
+import struct
+from .exif import read_exif
+from .reader import map_file
+
+# resolved once instead of searching ExifTags.TAGS on every image
+ORIENTATION_TAG = ExifTags.Base.Orientation
+# lossless transposes for the EXIF orientations, the same table
+# ImageOps.exif_transpose uses, 1 (or no tag) needs nothing
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+def orient_image(image, orientation):
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    if method is None:
+        return image
+    return image.transpose(method)
+
+def capped_size(size, max_edge):
+    width, height = size
+    scale = max_edge / max(width, height)
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+def open_image(image_path, draft_size=None, max_edge=None):
+    # decoded from a read-only mapping of the file, see map_file
+    with map_file(image_path) as data:
+        try:
+            image = Image.open(data)
+        except ValueError:
+            # format probes seek past the end of a short file, which a mapping
+            # refuses where a file object would just read nothing
+            raise UnidentifiedImageError(f"cannot identify image file {image_path!r}") from None
+        # getexif only reads IFD0, where the orientation lives, unlike _getexif
+        # which also expands the Exif and GPS sub-IFDs
+        try:
+            orientation = image.getexif().get(ORIENTATION_TAG)
+        except (SyntaxError, ValueError, struct.error, OSError):
+            orientation = None
+        capped = max_edge is not None and max(image.size) > max_edge
+        if capped and draft_size is None:
+            # the smallest JPEG scale that still leaves the long edge >= max_edge,
+            # the rest is a light resize once the pixels are decoded
+            draft_size = capped_size(image.size, max_edge)
+        if draft_size is not None:
+            # let libjpeg decode at 1/2, 1/4 or 1/8 scale, a no-op for other formats
+            image.draft(image.mode, draft_size)
+        image.load()
+    if capped and max(image.size) > max_edge:
+        # resized before orienting so the transpose moves the smaller image,
+        # the gap lets Pillow box-reduce first when the factor is large
+        image = image.resize(capped_size(image.size, max_edge), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return orient_image(image, orientation)
+
+def load_thumbnail(image_path, size=(300, 300)):
+    image = open_image(image_path, draft_size=size)
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    return image
+
+def load_exif_thumbnail(image_path, size=(300, 300)):
+    # The ~160px preview cameras embed in IFD1, parsed from the mapped APP1 segment
+    # without touching the compressed image data. Scaled to `size` so the tile
+    # doesn't change size when the real preview replaces it.
+    try:
+        with map_file(image_path) as data:
+            exif = read_exif(data)
+        if exif is None or not exif["thumbnail"]:
+            return None
+        image = Image.open(io.BytesIO(exif["thumbnail"]))
+        image.load()
+    except (ValueError, OSError, struct.error, IndexError, KeyError):
+        return None
+    image = orient_image(image, exif["0th"].get(piexif.ImageIFD.Orientation))
+    return ImageOps.contain(image, size)
@@ -0,0 +1,67 @@
+from functools import lru_cache
+from typing import Dict, Tuple
+from PIL import Image, ImageDraw, ImageFont
+from .models import Corner
+from .fonts import get_font, fit_font_size
+
+class TextLayout:
+    font: ImageFont.FreeTypeFont
+    x: int
+    y: int
+    line_height: int
+    right_aligned: bool
+    line_widths: Dict[str, float]
+
+    def __init__(self, font: ImageFont.FreeTypeFont, x: int, y: int, line_height: int,
+                 right_aligned: bool, line_widths: Dict[str, float]):
+        self.font = font
+        self.x = x
+        self.y = y
+        self.line_height = line_height
+        self.right_aligned = right_aligned
+        # widths of the lines that are the same on every image of the batch
+        self.line_widths = line_widths
+
+@lru_cache(maxsize=64)
+def get_text_layout(size: Tuple[int, int], mode: str, corner: Corner, font_s: int, font_path: str,
+                    long_line: str, static_lines: Tuple[str, ...], line_count: int):
+    # Everything here only depends on the arguments, so images of the same size
+    # in a batch share one layout and only draw their text.
+    width, height = size
+    ratio = 8 / 7
+    if (width / height) > 1.25:
+        ratio = 5 / 7
+    if (height / width) > 1.4:
+        ratio = 10 / 7
+
+    # measure with the same font mode the image's own ImageDraw would use
+    draw = ImageDraw.Draw(Image.new(mode, (1, 1)))
+    font_size = int((width / len(long_line)) * ratio)
+    font_size, text_width = fit_font_size(draw, long_line, font_size, width - 20, font_path)
+    font = get_font(font_path, font_size)
+
+    if(font_s != 0):
+        font = get_font(font_path, font_s)
+
+    text_block_height = font.size * line_count
+    if corner == Corner.TOP_LEFT:
+        position = (10, 10)
+    elif corner == Corner.TOP_RIGHT:
+        position = (width - text_width - 10, 10)
+    elif corner == Corner.BOTTOM_LEFT:
+        position = (10, height - text_block_height - 10)
+    else:
+        position = (width - text_width - 10, height - text_block_height - 10)
+
+    right_aligned = corner in [Corner.TOP_RIGHT, Corner.BOTTOM_RIGHT]
+    line_widths = {}
+    if right_aligned:
+        line_widths = {line: draw.textlength(line, font=font) for line in static_lines}
+    return TextLayout(
+        font=font,
+        x=position[0],
+        y=position[1],
+        line_height=font.size,
+        right_aligned=right_aligned,
+        line_widths=line_widths
+    )
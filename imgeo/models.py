@@ -0,0 +1,58 @@
+from enum import Enum
+
+class LatitudeRef(Enum):
+    N="N"
+    S="S"
+    
+    @classmethod
+    def values(self):
+        return [el.value for el in self]
+
+class LongitudeRef(Enum):
+    E="E"
+    W="W"
+    @classmethod
+    def values(self):
+        return [el.value for el in self]
+
+class Corner(Enum):
+    TOP_LEFT="Top Left"
+    TOP_RIGHT="Top Right"
+    BOTTOM_LEFT="Bottom Left"
+    BOTTOM_RIGHT="Bottom Right"
+    
+    @classmethod
+    def values(self):
+        return [el.value for el in self]
+    
+    @classmethod
+    def from_string(self, val):
+        for mem in self:
+            if mem.value == val:
+                return mem
+        return val
+
+class FinalImage:
+    image_path: str
+    exif_bytes: bytes
+    image_bytes: bytes
+    output_path: str
+    output_name: str
+    encoded_bytes: int
+    encode_seconds: float
+    quality: int
+    
+    def __init__(self, image_path: str, exif_bytes: bytes, image_bytes: bytes = None, output_path: str = None,
+                 output_name: str = None, encoded_bytes: int = 0, encode_seconds: float = 0.0,
+                 quality: int = None):
+        self.image_path = image_path
+        self.exif_bytes = exif_bytes
+        # either the encoded image is kept in memory or it was already written to output_path
+        self.image_bytes = image_bytes
+        self.output_path = output_path
+        self.output_name = output_name
+        # size and encode time of the output, reported per encoder profile
+        self.encoded_bytes = encoded_bytes
+        self.encode_seconds = encode_seconds
+        # the JPEG/WebP quality used, picked by the search when there's a size budget
+        self.quality = quality
@@ -0,0 +1,24 @@
+import math
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+# modes where pasting a white RGBA tile blends the same way draw.text does,
+# on RGBA images draw.text also writes the coverage into the alpha band
+TILE_MODES = ("RGB", "L")
+
+@lru_cache(maxsize=64)
+def get_line_tile(line: str, font: ImageFont.FreeTypeFont, start_x: float, start_y: float):
+    # White text on a transparent tile, its alpha is the glyph coverage. The
+    # sub-pixel start is part of the key so the glyphs rasterize exactly as
+    # draw.text would place them on the image.
+    left, top, right, bottom = font.getbbox(line)
+    offset_x = max(0, -math.floor(left)) + 1
+    offset_y = max(0, -math.floor(top)) + 1
+    tile = Image.new("RGBA", (offset_x + math.ceil(right) + 2, offset_y + math.ceil(bottom) + 2), (255, 255, 255, 0))
+    ImageDraw.Draw(tile).text((offset_x + start_x, offset_y + start_y), line, font=font, fill="white")
+    return tile, offset_x, offset_y
+
+def paste_line(image, xy, line, font):
+    x, y = xy
+    tile, offset_x, offset_y = get_line_tile(line, font, math.modf(x)[0], math.modf(y)[0])
+    image.paste(tile, (int(x) - offset_x, int(y) - offset_y), tile)
@@ -0,0 +1,124 @@
+import csv
+import secrets
+from itertools import accumulate
+from datetime import datetime, timedelta
+from typing import List, Tuple
+from .models import Corner
+from .exif import COORD_SCALE, to_units, dms_from_units
+from .encode import DEFAULT_PROFILE
+from .processing import ImageJob
+
+# the last three of the eight decimals are random per photo
+JITTER = 1000
+
+class PlanRecord:
+    image_path: str
+    date: datetime
+    latitude: float
+    longitude: float
+    latitude_ref: str
+    longitude_ref: str
+    latitude_dms: Tuple[int, int, int]
+    longitude_dms: Tuple[int, int, int]
+
+    def __init__(self, image_path: str, date: datetime, latitude_units: int, longitude_units: int,
+                 latitude_ref: str, longitude_ref: str):
+        self.image_path = image_path
+        self.date = date
+        self.latitude = latitude_units / COORD_SCALE
+        self.longitude = longitude_units / COORD_SCALE
+        self.latitude_ref = latitude_ref
+        self.longitude_ref = longitude_ref
+        self.latitude_dms = dms_from_units(latitude_units)
+        self.longitude_dms = dms_from_units(longitude_units)
+
+def secure_random_numbers(count, start, end):
+    # `count` uniform ints in [start, end) from one urandom read for the whole
+    # batch, draws past the largest multiple of the span are redrawn so the
+    # modulo stays unbiased
+    span = end - start
+    if span <= 0:
+        return [start] * count
+    limit = 2 ** 32 - 2 ** 32 % span
+    numbers = []
+    while len(numbers) < count:
+        draws = memoryview(secrets.token_bytes(4 * (count - len(numbers)))).cast("I")
+        numbers.extend(start + draw % span for draw in draws if draw < limit)
+    return numbers
+
+def plan_metadata(image_paths, start: datetime, latitude_deg: float, longitude_deg: float,
+                  latitude_ref: str, longitude_ref: str, from_minutes: int = 0, to_minutes: int = 0):
+    # Each photo is taken a random few minutes after the previous one and gets
+    # its own jitter in the last three decimals of the coordinates. Times are
+    # seconds after `start`'s minute and coordinates 1e-8 degree units, so the
+    # whole batch is planned with integer arithmetic before any image is opened.
+    count = len(image_paths)
+    seconds = secure_random_numbers(count, 0, 60)
+    minutes = accumulate(secure_random_numbers(count - 1, from_minutes, to_minutes), initial=0)
+    first_minute = start.replace(second=0)
+    dates = [first_minute + timedelta(seconds=60 * minute + second) for minute, second in zip(minutes, seconds)]
+
+    latitude_base = to_units(abs(latitude_deg)) // JITTER * JITTER
+    longitude_base = to_units(abs(longitude_deg)) // JITTER * JITTER
+    latitude_jitter = secure_random_numbers(count, 0, JITTER - 1)
+    longitude_jitter = secure_random_numbers(count, 0, JITTER - 1)
+    return [
+        PlanRecord(
+            image_path=image_path,
+            date=date,
+            latitude_units=latitude_base + lat_jitter,
+            longitude_units=longitude_base + lon_jitter,
+            latitude_ref=latitude_ref,
+            longitude_ref=longitude_ref
+        )
+        for image_path, date, lat_jitter, lon_jitter in zip(image_paths, dates, latitude_jitter, longitude_jitter)
+    ]
+
+def jobs_from_plan(records: List[PlanRecord], address: str, pic_name: str, corner: Corner, font_s: int,
+                   font_path: str = None, output_dir: str = None, stamp_text: bool = True,
+                   profile: str = DEFAULT_PROFILE, max_bytes: int = None, max_edge: int = None):
+    return [
+        ImageJob(
+            image_path=record.image_path,
+            date=record.date,
+            latitude=record.latitude,
+            longitude=record.longitude,
+            latitude_ref=record.latitude_ref,
+            longitude_ref=record.longitude_ref,
+            latitude_dms=record.latitude_dms,
+            longitude_dms=record.longitude_dms,
+            address=address,
+            pic_name=pic_name,
+            corner=corner,
+            font_s=font_s,
+            font_path=font_path,
+            output_dir=output_dir,
+            stamp_text=stamp_text,
+            profile=profile,
+            max_bytes=max_bytes,
+            max_edge=max_edge
+        )
+        for record in records
+    ]
+
+def plan_jobs(image_paths, start: datetime, latitude_deg: float, longitude_deg: float,
+              latitude_ref: str, longitude_ref: str, address: str, pic_name: str,
+              corner: Corner, font_s: int, from_minutes: int = 0, to_minutes: int = 0,
+              font_path: str = None, output_dir: str = None, stamp_text: bool = True,
+              profile: str = DEFAULT_PROFILE, max_bytes: int = None, max_edge: int = None):
+    records = plan_metadata(image_paths, start, latitude_deg, longitude_deg,
+                            latitude_ref, longitude_ref, from_minutes, to_minutes)
+    return jobs_from_plan(records, address, pic_name, corner, font_s, font_path, output_dir, stamp_text, profile, max_bytes, max_edge)
+
+def write_plan_csv(records: List[PlanRecord], file):
+    writer = csv.writer(file)
+    writer.writerow(["image", "date", "latitude", "longitude", "latitude_dms", "longitude_dms"])
+    for record in records:
+        writer.writerow([
+            record.image_path,
+            record.date.strftime("%Y-%m-%d %H:%M:%S"),
+            f"{record.latitude:.8f}{record.latitude_ref}",
+            f"{record.longitude:.8f}{record.longitude_ref}",
+            "{} {} {}".format(*record.latitude_dms),
+            "{} {} {}".format(*record.longitude_dms)
+        ])
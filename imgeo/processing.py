@@ -0,0 +1,166 @@
+import os
+from collections import deque
+from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from time import perf_counter
+from .models import FinalImage, Corner
+from .imaging import open_image
+from .stamp import imprint_info_on_image
+from .reader import map_file
+from .exif import build_exif_bytes, read_orientation, insert_exif, to_dms
+from .encode import DEFAULT_PROFILE, encode_image, encode_within_budget, profile_quality, output_name, is_jpeg
+from .writer import write_atomically
+
+class ImageJob:
+    image_path: str
+    date: datetime
+    latitude: float
+    longitude: float
+    latitude_ref: str
+    longitude_ref: str
+    latitude_dms: Tuple[int, int, int]
+    longitude_dms: Tuple[int, int, int]
+    address: str
+    pic_name: str
+    corner: Corner
+    font_s: int
+    font_path: str
+    output_dir: str
+    stamp_text: bool
+    profile: str
+    max_bytes: int
+    max_edge: int
+
+    def __init__(self, image_path: str, date: datetime, latitude: float, longitude: float,
+                 latitude_ref: str, longitude_ref: str, address: str, pic_name: str,
+                 corner: Corner, font_s: int, font_path: str = None, output_dir: str = None,
+                 stamp_text: bool = True, latitude_dms: Tuple[int, int, int] = None,
+                 longitude_dms: Tuple[int, int, int] = None, profile: str = DEFAULT_PROFILE,
+                 max_bytes: int = None, max_edge: int = None):
+        self.image_path = image_path
+        self.date = date
+        self.latitude = latitude
+        self.longitude = longitude
+        self.latitude_ref = latitude_ref
+        self.longitude_ref = longitude_ref
+        # the EXIF rationals, planned with the rest of the batch when given
+        self.latitude_dms = latitude_dms if latitude_dms is not None else to_dms(latitude)
+        self.longitude_dms = longitude_dms if longitude_dms is not None else to_dms(longitude)
+        self.address = address
+        self.pic_name = pic_name
+        self.corner = corner
+        self.font_s = font_s
+        self.font_path = font_path
+        self.output_dir = output_dir
+        self.stamp_text = stamp_text
+        self.profile = profile
+        # size budget per output file, None for no limit
+        self.max_bytes = max_bytes
+        # export resolution cap on the long edge, None keeps the original size
+        self.max_edge = max_edge
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def is_exif_only(image_path, stamp_text: bool = True, max_bytes: int = None, max_edge: int = None):
+    # a size budget or a resolution cap needs a re-encode, the EXIF-only
+    # splice keeps the original as it is
+    return not stamp_text and max_bytes is None and max_edge is None and is_jpeg(image_path)
+
+def job_output_name(image_path, profile: str = DEFAULT_PROFILE, stamp_text: bool = True,
+                    max_bytes: int = None, max_edge: int = None):
+    # the name process_image writes, spliced JPEGs keep theirs whatever the profile
+    if is_exif_only(image_path, stamp_text, max_bytes, max_edge):
+        return os.path.basename(image_path)
+    return output_name(image_path, profile)
+
+def insert_exif_only(job: ImageJob):
+    # Metadata only: the new EXIF segment is spliced into the original JPEG
+    # stream, the pixels are never decoded or re-encoded.
+    with map_file(job.image_path) as data:
+        orientation = read_orientation(data)
+        # the original EXIF is replaced, keep its orientation so viewers still rotate the photo
+        exif_bytes = build_exif_bytes(
+            dt=job.date,
+            latitude_dms=job.latitude_dms,
+            longitude_dms=job.longitude_dms,
+            latitude_ref=job.latitude_ref,
+            longitude_ref=job.longitude_ref,
+            orientation=orientation
+        )
+        started = perf_counter()
+        image_bytes = insert_exif(exif_bytes, data)
+    name = job_output_name(job.image_path, job.profile, job.stamp_text, job.max_bytes, job.max_edge)
+    return finish_image(job, exif_bytes, image_bytes, name, perf_counter() - started)
+
+def finish_image(job: ImageJob, exif_bytes, image_bytes, name, encode_seconds, quality=None):
+    # streamed batches write from the worker, otherwise the bytes go back to the caller
+    final_image = FinalImage(
+        image_path=job.image_path,
+        exif_bytes=exif_bytes,
+        output_name=name,
+        encoded_bytes=len(image_bytes),
+        encode_seconds=encode_seconds,
+        quality=quality
+    )
+    if job.output_dir is not None:
+        final_image.output_path = write_atomically(os.path.join(job.output_dir, name), image_bytes)
+    else:
+        final_image.image_bytes = image_bytes
+    return final_image
+
+def process_image(job: ImageJob):
+    if is_exif_only(job.image_path, job.stamp_text, job.max_bytes, job.max_edge):
+        return insert_exif_only(job)
+    # downscaled before stamping, the text is laid out at the export resolution
+    image = open_image(job.image_path, max_edge=job.max_edge)
+    if job.stamp_text:
+        imprint_info_on_image(
+            image=image,
+            date=job.date.strftime("%d %b %Y  %H:%M:%S"),
+            latitude=f"{job.latitude}{job.latitude_ref}",
+            longitude=f"{job.longitude}{job.longitude_ref}",
+            address=job.address,
+            pic_name=job.pic_name,
+            corner=job.corner,
+            font_s=job.font_s,
+            font_path=job.font_path
+        )
+    exif_bytes = build_exif_bytes(
+        dt=job.date,
+        latitude_dms=job.latitude_dms,
+        longitude_dms=job.longitude_dms,
+        latitude_ref=job.latitude_ref,
+        longitude_ref=job.longitude_ref
+    )
+    started = perf_counter()
+    if job.max_bytes is not None:
+        image_bytes, quality = encode_within_budget(image, job.image_path, exif_bytes, job.max_bytes, profile=job.profile)
+    else:
+        image_bytes = encode_image(image, job.image_path, exif_bytes, profile=job.profile)
+        quality = profile_quality(job.image_path, job.profile)
+    encode_seconds = perf_counter() - started
+    name = job_output_name(job.image_path, job.profile, job.stamp_text, job.max_bytes, job.max_edge)
+    return finish_image(job, exif_bytes, image_bytes, name, encode_seconds, quality)
+
+def process_batch(jobs, max_workers: int = 0):
+    # Yields the processed images in the order of `jobs`. At most two jobs per
+    # worker are in flight so finished images don't pile up in the parent.
+    workers = max_workers or default_workers()
+    if workers == 1:
+        for job in jobs:
+            yield process_image(job)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for job in jobs:
+            pending.append(executor.submit(process_image, job))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,22 @@
+import mmap
+from contextlib import contextmanager
+
+@contextmanager
+def map_file(path):
+    # Maps the whole file read-only. The mapping is a buffer (sliced for the
+    # EXIF segment) and a file object (read and seek for Image.open) at once,
+    # so the decoder and the EXIF parser share one open of the file and no
+    # Python-side read buffer. Pixels must be loaded before the block ends.
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files, report it the way Image.open would
+            raise OSError(f"cannot map empty file {path!r}") from None
+    try:
+        if hasattr(mapped, "madvise"):
+            # the decoder walks the file front to back once
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        yield mapped
+    finally:
+        mapped.close()
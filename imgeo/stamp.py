@@ -0,0 +1,37 @@
+from PIL import ImageDraw
+from .layout import get_text_layout
+from .overlay import TILE_MODES, paste_line
+
+# the stamp fonts have fixed-width digits, zeroing them keeps a line's width
+ZERO_DIGITS = str.maketrans("123456789", "000000000")
+
+def imprint_info_on_image(image, date, latitude, longitude, address, pic_name, corner, font_s, font_path=None):
+    lines = [f"{date}", f"{latitude} {longitude}", f"{address}"]
+    if pic_name is not None and pic_name != "":
+        lines.append(f"{pic_name}")
+    width, height = image.size
+
+    # the date and coordinates change on every image, the layout is fitted on
+    # their zeroed form so one layout serves the batch, the real lines are
+    # only measured when drawn
+    long_line = max([line.translate(ZERO_DIGITS) for line in lines[:2]] + lines[2:], key=len)
+    layout = get_text_layout(image.size, image.mode, corner, font_s, font_path, long_line, tuple(lines[2:]), len(lines))
+
+    draw = ImageDraw.Draw(image)
+    y_text = layout.y
+    for index, line in enumerate(lines):
+        if layout.right_aligned:
+            if line in layout.line_widths:
+                line_width = layout.line_widths[line]
+            else:
+                line_width = draw.textlength(line, font=layout.font)
+            x_text = width - line_width - 10
+        else:
+            x_text = layout.x
+        # address and pic name look the same on every image, they are
+        # rasterized once and composited, only date and coordinates are drawn
+        if index >= 2 and image.mode in TILE_MODES:
+            paste_line(image, (x_text, y_text), line, layout.font)
+        else:
+            draw.text((x_text, y_text), line, font=layout.font, fill="white")
+        y_text += layout.line_height
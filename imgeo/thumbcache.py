@@ -0,0 +1,183 @@
+import os
+import sys
+import hashlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from .imaging import load_thumbnail, load_exif_thumbnail
+from .writer import remove_quietly
+
+CACHE_LIMIT_BYTES = 200 * 1024 * 1024
+
+def default_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "imGeo", "thumbnails")
+
+class ThumbnailCache:
+    # Previews on disk keyed by path, mtime and size of the source, so an
+    # edited or replaced photo gets a new entry. Hits refresh the entry's mtime
+    # and the least recently used entries go once the cache outgrows max_bytes.
+    cache_dir: str
+    max_bytes: int
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = CACHE_LIMIT_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        # the preview pool shares one cache, the size count and eviction
+        # run under this lock
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError:
+            pass
+
+    def entry_path(self, image_path, size):
+        stat = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+    def get(self, image_path, size):
+        path = self.entry_path(image_path, size)
+        try:
+            image = Image.open(path)
+            image.load()
+        except (OSError, SyntaxError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def put(self, image_path, size, image):
+        path = self.entry_path(image_path, size)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            image.save(tmp_path, format="JPEG", quality=85)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError):
+            remove_quietly(tmp_path)
+            return
+        with self.lock:
+            try:
+                if self.total_bytes is None:
+                    self.total_bytes = sum(size for _, size, _ in self.scan())
+                else:
+                    self.total_bytes += os.path.getsize(path)
+                if self.total_bytes > self.max_bytes:
+                    self.evict()
+            except OSError:
+                # counted again from the folder on the next write
+                self.total_bytes = None
+
+    def scan(self):
+        # (mtime, size, path) of the finished entries, other threads' .tmp
+        # files are skipped and entries removed meanwhile are left out
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.scan())
+        # trim to 90% so a full cache doesn't evict on every write
+        target = self.max_bytes * 0.9
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= size
+        self.total_bytes = total
+
+    def load(self, image_path, size=(300, 300)):
+        image = self.get(image_path, size)
+        if image is None:
+            image = load_thumbnail(image_path, size)
+            self.put(image_path, size, image)
+        return image
+
+class ThumbnailService:
+    # Decodes previews on a thread pool (Pillow releases the GIL while it
+    # decodes and resizes) and hands them back as raw RGB buffers on `results`.
+    # The Tk side turns them into PhotoImages, the only part that has to run
+    # on its thread.
+    cache: ThumbnailCache
+    size: tuple
+    results: queue.Queue
+
+    def __init__(self, cache: ThumbnailCache, size: tuple = (300, 300), workers: int = 0):
+        self.cache = cache
+        self.size = size
+        self.results = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        # key -> token of its latest request, a job whose token was replaced or
+        # cancelled stops before decoding anything more
+        self.wanted = {}
+        self.lock = threading.Lock()
+
+    def request(self, key, image_path):
+        with self.lock:
+            if key in self.wanted:
+                return
+            token = self.wanted[key] = object()
+        self.executor.submit(self.load, key, token, image_path)
+
+    def cancel(self, key, token=None):
+        with self.lock:
+            if token is None or self.wanted.get(key) is token:
+                self.wanted.pop(key, None)
+
+    def is_wanted(self, key, token):
+        with self.lock:
+            return self.wanted.get(key) is token
+
+    def load(self, key, token, image_path):
+        # the embedded EXIF thumbnail goes out first when the full preview
+        # isn't cached yet
+        try:
+            if not self.is_wanted(key, token):
+                return
+            image = self.cache.get(image_path, self.size)
+            if image is None:
+                preview = load_exif_thumbnail(image_path, self.size)
+                if preview is not None:
+                    self.emit(key, preview, False)
+                if not self.is_wanted(key, token):
+                    return
+                image = self.cache.load(image_path, self.size)
+            self.emit(key, image, True)
+        except OSError:
+            pass
+        finally:
+            self.cancel(key, token)
+
+    def emit(self, key, image, is_final):
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        self.results.put((key, image.size, image.tobytes(), is_final))
+
+    def shutdown(self):
+        with self.lock:
+            self.wanted.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,72 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def temp_path(path):
+    # next to the target so the rename never crosses filesystems
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def replace_atomically(tmp_path, path):
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        remove_quietly(tmp_path)
+        raise
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def write_atomically(path, data):
+    # a crash or a full disk leaves the old file (or none), never half an image
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError:
+        remove_quietly(tmp_path)
+        raise
+    replace_atomically(tmp_path, path)
+    return path
+
+def name_clashes(paths, name=os.path.basename):
+    # output names more than one input maps to, compared case-folded since
+    # Windows and macOS folders don't tell IMG.jpg from img.jpg
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(name(path).lower(), []).append(path)
+    return {key: clashing for key, clashing in by_name.items() if len(clashing) > 1}
+
+def write_images(final_images, output_dir, max_workers: int = 0):
+    # Writes the in-memory results to output_dir on a thread pool and yields
+    # each output path as soon as its file is in place. Writes are I/O bound
+    # and release the GIL, at most two per worker are queued at a time.
+    workers = max_workers or os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = set()
+    written = set()
+    try:
+        for final_image in final_images:
+            if final_image.image_bytes is None:
+                continue
+            output_name = final_image.output_name or os.path.basename(final_image.image_path)
+            # never let a later image replace an earlier one of the same batch
+            if output_name.lower() in written:
+                raise ValueError(f"more than one image would be saved as {output_name}")
+            written.add(output_name.lower())
+            output_path = os.path.join(output_dir, output_name)
+            pending.add(executor.submit(write_atomically, output_path, final_image.image_bytes))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
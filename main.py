@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from tkinterdnd2 import TkinterDnD
 import sys
+import multiprocessing
 sys.path.insert(0, "./frames")
 sys.path.insert(1, "./utils")
 from home import HomeFrame
@@ -74,5 +75,6 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.final_frame.pack(expand=True, fill="both", padx=40, pady=40)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
\ No newline at end of file
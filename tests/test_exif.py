@@ -0,0 +1,29 @@
+from datetime import datetime
+import pytest
+from imgeo.exif import build_exif_bytes, dump_exif, get_exif_template
+from imgeo.plan import plan_metadata
+
+ORIENTATIONS = [None] + list(range(1, 9))
+
+@pytest.mark.parametrize("latitude_ref", ["N", "S"])
+@pytest.mark.parametrize("longitude_ref", ["E", "W"])
+def test_template_matches_dump(latitude_ref, longitude_ref):
+    records = plan_metadata(
+        image_paths=[f"IMG_{index:04}.jpg" for index in range(200)],
+        start=datetime(2023, 12, 31, 23, 30),
+        latitude_deg=51.5072 if latitude_ref == "N" else -33.8688,
+        longitude_deg=0.1276 if longitude_ref == "E" else -151.2093,
+        latitude_ref=latitude_ref,
+        longitude_ref=longitude_ref,
+        from_minutes=1,
+        to_minutes=90
+    )
+    for orientation in ORIENTATIONS:
+        # the fast path only runs when a template could be laid out
+        assert get_exif_template(latitude_ref, longitude_ref, orientation) is not None
+        for record in records:
+            date_bytes = record.date.strftime("%Y:%m:%d %H:%M:%S").encode("utf-8")
+            expected = dump_exif(date_bytes, record.latitude_dms, record.longitude_dms,
+                                 latitude_ref, longitude_ref, orientation)
+            assert build_exif_bytes(record.date, record.latitude_dms, record.longitude_dms,
+                                    latitude_ref, longitude_ref, orientation) == expected
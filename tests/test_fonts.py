@@ -0,0 +1,35 @@
+import pytest
+from PIL import Image, ImageDraw
+from imgeo.fonts import get_font, fit_font_size
+
+STRINGS = [
+    "17 Neville Road, IG6 2LN",
+    "Latitude: 12.97160000N",
+    "01 Jan 2024  10:00:00",
+    "W",
+    "A much longer address line, 221B Baker Street, Marylebone, London NW1 6XE"
+]
+
+def decrement_loop(draw, text, start_size, max_width, font_path=None):
+    # the sizing loop fit_font_size replaced, stopped at 1 where the old one
+    # went on to ask FreeType for size 0
+    font_size = start_size
+    text_width = draw.textlength(text, font=get_font(font_path, font_size))
+    while text_width > max_width and font_size > 1:
+        font_size -= 1
+        text_width = draw.textlength(text, font=get_font(font_path, font_size))
+    return font_size, text_width
+
+@pytest.fixture(scope="module")
+def draw():
+    return ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+@pytest.mark.parametrize("text", STRINGS)
+def test_matches_decrement_loop(draw, text):
+    for width in [20, 64, 150, 333, 640, 1024, 1920, 4000]:
+        start_size = max(1, int(width / len(text) * 8 / 7))
+        for start in {start_size, start_size * 2, start_size + 7}:
+            assert fit_font_size(draw, text, start, width - 20) == decrement_loop(draw, text, start, width - 20)
+
+def test_start_size_below_one(draw):
+    assert fit_font_size(draw, STRINGS[0], 0, 10)[0] == 1
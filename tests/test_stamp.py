@@ -0,0 +1,44 @@
+import random
+import pytest
+from PIL import Image, ImageChops
+from imgeo import stamp
+from imgeo.models import Corner
+
+# largest per-channel difference allowed between the tile compositing and
+# drawing every line with draw.text
+TOLERANCE = 1
+SIZES = [(640, 480), (480, 640), (1200, 1200)]
+
+def noise_image(mode, size, seed):
+    bands = len(Image.new(mode, (1, 1)).getbands())
+    rng = random.Random(seed)
+    return Image.frombytes(mode, size, rng.randbytes(size[0] * size[1] * bands))
+
+def stamped(image, corner, font_s, index):
+    stamp.imprint_info_on_image(
+        image=image,
+        date=f"0{index % 9 + 1} Jan 2024  10:{index % 60:02}:00",
+        latitude=f"12.9716{index:04}N",
+        longitude=f"77.5946{index:04}E",
+        address="17 Neville Road, IG6 2LN",
+        pic_name="Site visit" if index % 2 else None,
+        corner=corner,
+        font_s=font_s
+    )
+    return image
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "RGBA"])
+@pytest.mark.parametrize("corner", list(Corner))
+@pytest.mark.parametrize("font_s", [0, 28])
+def test_matches_draw_text(monkeypatch, mode, corner, font_s):
+    for index, size in enumerate(SIZES):
+        image = noise_image(mode, size, index)
+        tiled = stamped(image.copy(), corner, font_s, index)
+        # no tile modes puts every line through draw.text, the path before the tiles
+        monkeypatch.setattr(stamp, "TILE_MODES", ())
+        drawn = stamped(image.copy(), corner, font_s, index)
+        monkeypatch.undo()
+        extrema = ImageChops.difference(tiled, drawn).getextrema()
+        if mode == "L":
+            extrema = [extrema]
+        assert max(high for low, high in extrema) <= TOLERANCE
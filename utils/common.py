@@ -1,6 +1,5 @@
 from enum import Enum
 import customtkinter as ctk
-from PIL import Image, ExifTags
 import sys
 
 class Screen(Enum):
@@ -8,39 +7,6 @@ class Screen(Enum):
     DETAILS="details"
     FINAL="FINAL"
 
-class LatitudeRef(Enum):
-    N="N"
-    S="S"
-    
-    @classmethod
-    def values(self):
-        return [el.value for el in self]
-
-class LongitudeRef(Enum):
-    E="E"
-    W="W"
-    @classmethod
-    def values(self):
-        return [el.value for el in self]
-
-    
-
-class Corner(Enum):
-    TOP_LEFT="Top Left"
-    TOP_RIGHT="Top Right"
-    BOTTOM_LEFT="Bottom Left"
-    BOTTOM_RIGHT="Bottom Right"
-    
-    @classmethod
-    def values(self):
-        return [el.value for el in self]
-    
-    @classmethod
-    def from_string(self, val):
-        for mem in self:
-            if mem.value == val:
-                return mem
-        return val
 class FloatEntry(ctk.CTkEntry):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -55,16 +21,6 @@ class FloatEntry(ctk.CTkEntry):
             return False
         return 0 <= value <= 90
 
-class FinalImage:
-    image_path: str
-    image: Image.Image
-    exif_bytes: bytes
-    
-    def __init__(self, image_path: str, image: Image.Image, exif_bytes: bytes):
-        self.image_path = image_path
-        self.image = image
-        self.exif_bytes = image
-
 class IntSpinbox(ctk.CTkFrame):
     def __init__(self, *args,
                  width: int = 100,
@@ -170,24 +126,3 @@ class IntSpinbox(ctk.CTkFrame):
             if int(self.entry.get()) < to:
                 self.add_button.configure(state=ctk.NORMAL)
         super().configure(**kwargs)
-    
-def open_image(image_path):
-    
-    image = Image.open(image_path)
-    
-    try:
-        exif = image._getexif()
-        if exif is not None:
-            orientation_key = next(key for key, value in ExifTags.TAGS.items() if value == 'Orientation')
-
-            if orientation_key in exif:
-                if exif[orientation_key] == 3:
-                    image = image.rotate(180, expand=True)
-                elif exif[orientation_key] == 6:
-                    image = image.rotate(270, expand=True)
-                elif exif[orientation_key] == 8:
-                    image = image.rotate(90, expand=True)
-    except (AttributeError, KeyError, IndexError):
-        pass
-
-    return image
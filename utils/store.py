@@ -1,9 +1,10 @@
 import sys
 sys.path.insert(0,"./")
-from common import FinalImage, Screen, LatitudeRef, LongitudeRef, Corner
+from common import Screen
+from imgeo.models import FinalImage, LatitudeRef, LongitudeRef, Corner
+from imgeo.encode import DEFAULT_PROFILE
 from datetime import datetime
 from typing import List
-from PIL import Image
 
 class Store:
     _instance = None
@@ -21,6 +22,14 @@ class Store:
     to_minutes: int = 0
     corner: Corner = Corner.BOTTOM_RIGHT
     font_size: int = 0
+    font_path: str = None
+    workers: int = 0
+    save_while_processing: bool = False
+    stamp_text: bool = True
+    encoder_profile: str = DEFAULT_PROFILE
+    max_kilobytes: int = 0
+    max_edge: int = 0
+    output_dir: str = None
     
     def __new__(self, *args, **kwargs):
         if not self._instance:
@@ -42,8 +51,8 @@ class Store:
             "address": self.address
         }
         
-    def insert_final_image(self, image_path: str, image: Image.Image, exif_bytes: bytes):
-        self._final_images.append(FinalImage(image_path=image_path, image=image, exif_bytes=exif_bytes))
+    def insert_final_image(self, final_image: FinalImage):
+        self._final_images.append(final_image)
         
     def get_final_images(self):
         return self._final_images
@@ -65,3 +74,10 @@ class Store:
         self.to_minutes = 0
         self.corner = Corner.BOTTOM_RIGHT
         self.font_size = 0
+        self.font_path = None
+        self.save_while_processing = False
+        self.stamp_text = True
+        self.max_edge = 0
+        self.max_kilobytes = 0
+        self.encoder_profile = DEFAULT_PROFILE
+        self.output_dir = None